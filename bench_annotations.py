@@ -0,0 +1,50 @@
+# Measuring the time and the memory taken by getAllAnnotations on a
+# large relational database. The 271 sample annotations are repeated
+# under unique ids until the requested number of rows is reached.
+# Usage: python bench_annotations.py [rows]
+
+import sys
+from os import sep
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from tracemalloc import start, stop, get_traced_memory, reset_peak
+
+import pandas as pd
+
+from impl import AnnotationProcessor, RelationalQueryProcessor, GenericQueryProcessor
+
+rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+
+with TemporaryDirectory() as folder:
+    # 1) Building the annotations file, with a unique id for each repetition
+    sample = pd.read_csv("data" + sep + "annotations.csv", dtype=str)
+    repeats = -(-rows // len(sample))
+    annotations = pd.concat([sample] * repeats, ignore_index=True).head(rows)
+    annotations["id"] = annotations["id"] + "-" + annotations.index.astype(str)
+    csv_path = folder + sep + "annotations.csv"
+    annotations.to_csv(csv_path, index=False)
+    del sample, annotations
+
+    # 2) Uploading it in the relational database
+    rel_path = folder + sep + "relational.db"
+    ann_dp = AnnotationProcessor()
+    ann_dp.setDbPathOrUrl(rel_path)
+    ann_dp.uploadData(csv_path)
+
+    rel_qp = RelationalQueryProcessor()
+    rel_qp.setDbPathOrUrl(rel_path)
+    generic = GenericQueryProcessor()
+    generic.addQueryProcessor(rel_qp)
+
+    # 3) Measuring the annotations kept by the caller and the peak reached to build them
+    start()
+    reset_peak()
+    before = perf_counter()
+    result = generic.getAllAnnotations()
+    seconds = perf_counter() - before
+    retained, peak = get_traced_memory()
+    stop()
+
+    print(f"{len(result)} annotations in {seconds:.2f} s")
+    print(f"retained: {retained / 2 ** 20:.1f} MiB, peak: {peak / 2 ** 20:.1f} MiB")
+    rel_qp.close()
@@ -2,26 +2,212 @@ import pandas as pd
 import rdflib
 from models.main_models import *  # import the entirety of main_models
 import sqlite3
+import asyncio
+import inspect
 from sqlite3 import connect
 from pandas import read_sql, concat
-from sparql_dataframe import get
-from json import load
-from rdflib import Graph, URIRef, Literal, RDF, RDFS  # for loading rdflibrary, used in CollectionProcessor
+from json import dumps, JSONDecoder, JSONDecodeError
+from io import BytesIO, TextIOWrapper
+from gzip import GzipFile, decompress as gunzip
+from zlib import decompress as inflate
+from itertools import islice
+from re import compile as regex
+from time import perf_counter, monotonic
+from collections import OrderedDict
+from functools import wraps, lru_cache
+from sys import platform
+from os import cpu_count, stat
+from os.path import abspath
+from hashlib import sha1, sha256
+from queue import LifoQueue, Empty
+from threading import BoundedSemaphore, Lock, current_thread, local
+from weakref import WeakValueDictionary
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import Manager
+from http.client import HTTPConnection, HTTPSConnection, HTTPException
+from urllib.parse import urlsplit, urlencode
+from rdflib import Graph, URIRef, Literal, BNode, RDF, RDFS  # for loading rdflibrary, used in CollectionProcessor
+from rdflib.store import Store
+from rdflib.plugins.sparql import prepareQuery, prepareUpdate
 from rdflib.plugins.stores.sparqlstore import \
     SPARQLUpdateStore  # for using rdflib plugin for sparql store update function
 
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
 
 # https://github.com/comp-data/2022-2023/tree/main/docs/project#uml-of-additional-classes
 
 # helper functions 
-def upload_to_db(db_path, df: pd.DataFrame, name):
+# pragmas of the connection bulk loading a CSV file, which is closed at the end of the load
+BULK_LOAD_PRAGMAS = {
+    "synchronous": "OFF",
+    "cache_size": -262144,  # 256 MB
+    "temp_store": "MEMORY",
+}
+
+
+def file_state(path: str, known: dict = None) -> dict:
+    """
+    It returns the mtime (in nanoseconds), size and sha256 hash of the file at the input path.
+    If known, the state recorded at the last upload, has the same mtime and
+    size, its hash is reused instead of reading the whole file again
+    """
+    info = stat(path)
+    state = {"mtime": info.st_mtime_ns, "size": info.st_size}
+    if known is not None and known["mtime"] == state["mtime"] and known["size"] == state["size"]:
+        state["hash"] = known["hash"]
+    else:
+        digest = sha256()
+        with open(path, mode="rb") as f:
+            for block in iter(lambda: f.read(1048576), b""):
+                digest.update(block)
+        state["hash"] = "sha256:" + digest.hexdigest()
+    return state
+
+
+def process_peak_memory():
+    #peak resident memory of the whole process since it started, in bytes, None where it cannot be read
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform == "darwin" else peak * 1024  # kilobytes on Linux
+
+
+def create_table(con, name, columns, key):
+    #create the table if missing and make its key unique, so that rows can be upserted
+    definitions = ", ".join(f'"{column}" TEXT' for column in columns)
+    con.execute(f"CREATE TABLE IF NOT EXISTS {name} ({definitions})")
+
+    key_name = f"key_{name.lower()}_{'_'.join(key)}"
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?"
+    if con.execute(query, (key_name,)).fetchone() is None:
+        # tables filled by older versions with append semantics may hold duplicates: keep the last one
+        key_columns = ", ".join(key)
+        con.execute(
+            f"DELETE FROM {name} WHERE rowid NOT IN (SELECT MAX(rowid) FROM {name} GROUP BY {key_columns})"
+        )
+        con.execute(f"DROP INDEX IF EXISTS idx_{name.lower()}_{'_'.join(key)}")
+        con.execute(f"CREATE UNIQUE INDEX {key_name} ON {name} ({key_columns})")
+
+
+def upload_csv_to_db(db_path, path, dtype: dict, tables: dict, chunk_size=100000) -> dict:
+    """
+    It streams the CSV file at the input path in chunks of chunk_size rows and
+    upserts them with executemany inside one single transaction, using the
+    BULK_LOAD_PRAGMAS. tables maps each destination table to a dictionary with:
+    "rows", the function building the rows of the table from a chunk;
+    "key", the columns identifying a row (a new row replaces the stored one
+    with the same key); "indexes", the other indexes of the table; and
+    optionally "replace", a (column, chunk column) pair: the stored rows whose
+    column holds a value of the chunk column are all deleted before the new
+    rows are inserted.
+    Uploading the same file again leaves the tables unchanged.
+    It returns a dictionary with the number of rows, the elapsed seconds,
+    the rows per second and the peak resident memory reached by the process
+    so far, this load included (in bytes)
+    """
+    start = perf_counter()
+    rows = 0
+
+    # no implicit transactions: the whole load is one explicit transaction
+    con = connect(db_path, isolation_level=None)
     try:
-        with connect(db_path) as con:
-            df.to_sql(name, con, if_exists='append', index=False)
-        return True
-    except Exception as e:
-        print(f"Upload failed: {str(e)}")
-        return False
+        for name, value in BULK_LOAD_PRAGMAS.items():
+            con.execute(f"PRAGMA {name} = {value}")
+        con.execute("BEGIN")
+        try:
+            created = set()
+            chunks = pd.read_csv(path, keep_default_na=False, dtype=dtype, chunksize=chunk_size)
+            for chunk in chunks:
+                for name, table in tables.items():
+                    frame = table["rows"](chunk)
+                    if name not in created:
+                        create_table(con, name, frame.columns, table["key"])
+                        created.add(name)
+                    if "replace" in table:
+                        # by the values in the chunk, even those the rows function leaves out
+                        column, source = table["replace"]
+                        con.executemany(
+                            f"DELETE FROM {name} WHERE {column} = ?",
+                            ((value,) for value in chunk[source].unique()),
+                        )
+                    columns = ", ".join(f'"{column}"' for column in frame.columns)
+                    con.executemany(
+                        f"INSERT OR REPLACE INTO {name} ({columns}) VALUES ({', '.join('?' * len(frame.columns))})",
+                        frame.itertuples(index=False, name=None),
+                    )
+                rows += len(chunk)
+            for name, table in tables.items():
+                create_indexes(con, name, table["indexes"])
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    finally:
+        con.close()
+
+    seconds = perf_counter() - start
+    return {
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_second": rows / seconds if seconds > 0 else 0.0,
+        "process_peak_memory": process_peak_memory(),
+    }
+
+
+def create_uploads_table(con):
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS Uploads (processor TEXT, path TEXT, "
+        "mtime INTEGER, size INTEGER, hash TEXT, PRIMARY KEY (processor, path))"
+    )
+
+
+def read_upload_state(db_path: str, processor: str, path: str) -> dict:
+    #the mtime, size and hash of the file when the processor last uploaded it in the relational database, or None
+    with connect(db_path) as con:
+        create_uploads_table(con)
+        row = con.execute(
+            "SELECT mtime, size, hash FROM Uploads WHERE processor = ? AND path = ?",
+            (processor, abspath(path)),
+        ).fetchone()
+    con.close()
+    return None if row is None else dict(zip(("mtime", "size", "hash"), row))
+
+
+def write_upload_state(db_path: str, processor: str, path: str, state: dict):
+    with connect(db_path) as con:
+        create_uploads_table(con)
+        con.execute(
+            "INSERT OR REPLACE INTO Uploads VALUES (?, ?, ?, ?, ?)",
+            (processor, abspath(path), state["mtime"], state["size"], state["hash"]),
+        )
+    con.close()
+
+
+def split_creators(metadata: pd.DataFrame) -> pd.DataFrame:
+    #one (entity_id, creator) row for each of the "; " separated creators of an entity
+    creators = metadata[["id", "creator"]].rename(columns={"id": "entity_id"})
+    creators["creator"] = creators["creator"].str.split(";")
+    creators = creators.explode("creator")
+    creators["creator"] = creators["creator"].str.strip()
+    return creators[creators["creator"].notna() & (creators["creator"] != "")]
+
+
+def has_table(con, name) -> bool:
+    #whether the database has the input table, matched case-insensitively as SQLite does
+    query = "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ? COLLATE NOCASE"
+    return con.execute(query, (name,)).fetchone() is not None
+
+
+def create_indexes(con, name, indexes):
+    #create the missing indexes of the table and refresh the statistics used by the query planner
+    for columns in indexes:
+        index_name = f"idx_{name.lower()}_{'_'.join(columns)}"
+        con.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {name} ({', '.join(columns)})")
+    con.execute(f"ANALYZE {name}")
 
 
 def remove_invalid_char(string: str):
@@ -33,58 +219,1086 @@ def remove_invalid_char(string: str):
     else:
         return string
 
-def create_graph(json_obj: dict, base_url: str, graph: Graph):
-    #create collection id to collect json file
-    collection_id = URIRef(json_obj['id'])
-    #define URIs types
-    type_canvas = URIRef(base_url + 'Canvas')
-    type_collection = URIRef(base_url + 'Collection')
-    type_manifest = URIRef(base_url + 'Manifest')
-    type_metadata = URIRef(base_url + 'Metadata')
-    #define URIs properties
+class JsonStream(object):
+    """
+    A minimal incremental JSON reader. It reads the file a chunk at a time and
+    lets the caller walk objects key by key and arrays item by item, so that
+    only the value currently being decoded has to be kept in memory
+    """
+
+    WHITESPACE = " \t\n\r"
+
+    def __init__(self, file, chunk_size: int = 65536):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = JSONDecoder()
+
+    def _read(self, size: int = None) -> bool:
+        # drop what has already been consumed and append the next chunk
+        if self.eof:
+            return False
+        chunk = self.file.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _consume(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Invalid JSON: expected '{char}'")
+        self.pos += 1
+
+    def peek(self) -> str:
+        """
+        It skips the whitespace and returns the next character,
+        or an empty string at the end of the file
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def value(self):
+        """It decodes and returns the next complete JSON value"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a value touching the end of the buffer (e.g. a number) may be truncated
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return obj
+            except JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read(max(self.chunk_size, len(self.buffer)))
+
+    def iter_keys(self):
+        """
+        It walks the object at the current position yielding its keys.
+        The caller must consume the value of each key before asking for the next one
+        """
+        self._consume("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self._consume(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self._consume("}")
+                return
+
+    def iter_items(self):
+        """
+        It walks the array at the current position yielding once per item.
+        The caller must consume each item before asking for the next one
+        """
+        self._consume("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self._consume("]")
+                return
+
+
+IIIF_LEVELS = ("Collection", "Manifest", "Canvas")
+
+
+def item_triples(subject: URIRef, level: str, child_id: str, canvas_ids: list, base_url: str):
+    #the triples linking an entity and one of its items, in both directions
+    child = URIRef(child_id)
+    yield (subject, URIRef(base_url + 'items'), child)
+    yield (child, URIRef(base_url + 'partOf'), subject)
+    if level == "Collection":
+        prop_part_of_collection = URIRef(base_url + 'partOfCollection')
+        for canvas_id in canvas_ids:
+            yield (URIRef(canvas_id), prop_part_of_collection, subject)
+
+
+def iter_entity_triples(stream: JsonStream, base_url: str, levels=IIIF_LEVELS):
+    """
+    It reads one IIIF entity (collection, manifest or canvas, depending on levels)
+    from the stream and yields its triples, descending into its items while
+    they are read. It returns the entity id
+    and the ids of the canvases in it, which a collection links to itself
+    """
     prop_id = URIRef('https://schema.org/identifier')
-    prop_part = URIRef('https://www.w3.org/2002/07/owl#hasPart')
-    prop_label = URIRef(base_url + 'label')
-    prop_items = URIRef(base_url + 'items')
-
-    # labeling json_obj
-    label_list = list(json_obj['label'].values())
-    label_value = label_list[0][0]
-    label_value = remove_invalid_char(str(label_value))
-
-    # create graph triples from the collection
-    graph.add((collection_id, prop_id, Literal(json_obj['id'])))
-    graph.add((collection_id, RDF.type, type_collection))
-    graph.add((collection_id, RDFS.label, Literal(str(label_value))))
-
-    # populate manifest
-    for manifest in json_obj['items']:
-        manifest_id = URIRef(manifest['id'])
-
-        graph.add((collection_id, prop_items, manifest_id))
-        graph.add((manifest_id, prop_id, Literal(manifest['id'])))
-        graph.add((manifest_id, RDF.type, type_manifest))
-        
 
-        manifest_label_list = list(manifest['label'].values())
-        manifest_label_value = manifest_label_list[0][0]
-        manifest_label_value = remove_invalid_char(str(manifest_label_value))
+    entity_id = None
+    label = None
+    children = []  # only used when the items come before the id
+    canvas_ids = []
+
+    for key in stream.iter_keys():
+        if key == "id":
+            entity_id = stream.value()
+        elif key == "label":
+            label = stream.value()
+        elif key == "items" and len(levels) > 1:
+            for _ in stream.iter_items():
+                child_id, child_canvas_ids = yield from iter_entity_triples(stream, base_url, levels[1:])
+                if levels[0] != "Collection":
+                    canvas_ids.extend(child_canvas_ids)
+                if entity_id is None:
+                    children.append((child_id, child_canvas_ids))
+                else:
+                    yield from item_triples(URIRef(entity_id), levels[0], child_id, child_canvas_ids, base_url)
+        else:
+            stream.value()
+
+    if entity_id is None:
+        raise ValueError(f"{levels[0]} without an id")
+
+    subject = URIRef(entity_id)
+    for child_id, child_canvas_ids in children:
+        yield from item_triples(subject, levels[0], child_id, child_canvas_ids, base_url)
+
+    label_value = remove_invalid_char(str(list(label.values())[0][0]))
+    yield (subject, prop_id, Literal(entity_id))
+    yield (subject, RDF.type, URIRef(base_url + levels[0]))
+    yield (subject, RDFS.label, Literal(str(label_value)))
+    if levels[0] == "Canvas":
+        canvas_ids = [entity_id]
+    return entity_id, canvas_ids
+
+
+def iter_collection_triples(path: str, base_url: str):
+    """
+    It yields the triples of the collection (or list of collections) stored
+    in the JSON file at the input path without loading the whole file in memory
+    """
+    with open(path, mode="r", encoding="utf-8") as j:
+        stream = JsonStream(j)
+        if stream.peek() == "[":
+            for _ in stream.iter_items():
+                yield from iter_entity_triples(stream, base_url)
+        else:
+            yield from iter_entity_triples(stream, base_url)
+
+
+def create_graph(path: str, base_url: str, graph: Graph = None) -> Graph:
+    #the triples of the collection file at the input path in an in-memory graph, e.g. to serialize it
+    graph = Graph() if graph is None else graph
+    graph.addN((s, p, o, graph) for s, p, o in iter_collection_triples(path, base_url))
+    return graph
+
+
+def values_block(ids) -> str:
+    #the content of a SPARQL VALUES block matching the input identifiers as literals
+    return " ".join(Literal(str(entity_id)).n3() for entity_id in ids)
+
+
+# the characters that cannot appear in an IRI written in SPARQL
+INVALID_IRI_CHARS = set('<>" {}|\\^`')
+
+
+def iri_values_block(ids) -> str:
+    #the content of a SPARQL VALUES block matching the entities having the input identifiers as IRIs
+    iris = []
+    for entity_id in map(str, ids):
+        # an invalid IRI cannot be the IRI of any entity, so it is left out
+        if INVALID_IRI_CHARS.isdisjoint(entity_id):
+            iris.append("<" + entity_id + ">")
+    return " ".join(iris)
+
+
+def insert_data_query(triples) -> str:
+    #build a single INSERT DATA update from a batch of triples
+    lines = [f"{s.n3()} {p.n3()} {o.n3()} ." for s, p, o in triples]
+    return "INSERT DATA {\n" + "\n".join(lines) + "\n}"
+
+
+def iter_batches(triples, batch_size):
+    #group the triples in lists of batch_size elements (all of them if batch_size is None or 0)
+    triples = iter(triples)
+    if not batch_size:
+        batch = list(triples)
+        if batch:
+            yield batch
+        return
+    while True:
+        batch = list(islice(triples, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+# the generation of the data of each SPARQL endpoint, increased after every update
+# sent to it from this process: cached query results of older generations are dropped
+ENDPOINT_GENERATIONS = {}
+GENERATIONS_LOCK = Lock()
+
+
+def endpoint_generation(endpoint: str) -> int:
+    return ENDPOINT_GENERATIONS.get(endpoint, 0)
+
+
+def bump_generation(endpoint: str):
+    #invalidate the cached query results of the endpoint after an update
+    with GENERATIONS_LOCK:
+        ENDPOINT_GENERATIONS[endpoint] = ENDPOINT_GENERATIONS.get(endpoint, 0) + 1
+
+
+class ResultCache(object):
+    """
+    A least recently used cache of query results, holding at most size of them.
+    Each result is kept with the generation of the data it was computed from, and 
+    it is dropped when the generation changes or when it is older than ttl seconds 
+    (never, if ttl is None). The hits and misses are counted to size the cache
+    """
+
+    def __init__(self, size: int = 128, ttl: float = 300):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, generation):
+        #the cached result for the key, or None
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry_generation, stored, value = entry
+                if entry_generation == generation and (
+                    self.ttl is None or monotonic() - stored < self.ttl
+                ):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, generation, value):
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (generation, monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def resize(self, size: int):
+        with self.lock:
+            self.size = size
+            while len(self.entries) > max(size, 0):
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            asked = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / asked if asked > 0 else 0.0,
+                "entries": len(self.entries),
+                "size": self.size,
+                "ttl": self.ttl,
+            }
+
+
+def upload_triples(endpoint: str, triples, batch_size=1000) -> dict:
+    """
+    It sends the input triples to the SPARQL endpoint grouped in INSERT DATA
+    requests of batch_size triples each, all inside the same store session.
+    If batch_size is None or 0, all the triples are sent in one single request.
+    It returns a dictionary with the number of triples, the number of requests,
+    the elapsed seconds and the triples per second. If endpoint is the path of a
+    local triplestore, each batch is added to it directly
+    """
+    count = 0
+    requests = 0
+    start = perf_counter()
+
+    if not is_sparql_endpoint(endpoint):
+        local = triplestore(endpoint)
+        for batch in iter_batches(triples, batch_size):
+            count += local.insert(batch)
+            requests += 1
+    else:
+        store = SPARQLUpdateStore()
+        store.open((endpoint, endpoint))
+        try:
+            for batch in iter_batches(triples, batch_size):
+                store.update(insert_data_query(batch))
+                count += len(batch)
+                requests += 1
+        finally:
+            store.close()
+            bump_generation(endpoint)
+
+    seconds = perf_counter() - start
+    return {
+        "triples": count,
+        "requests": requests,
+        "seconds": seconds,
+        "triples_per_second": count / seconds if seconds > 0 else 0.0,
+    }
+
+
+def upload_update(endpoint: str, query: str):
+    #send one SPARQL update to the endpoint (or run it on the local triplestore)
+    if not is_sparql_endpoint(endpoint):
+        triplestore(endpoint).update(query)
+        return
+    store = SPARQLUpdateStore()
+    store.open((endpoint, endpoint))
+    try:
+        store.update(query)
+    finally:
+        store.close()
+        bump_generation(endpoint)
+
+
+def parse_collection_file(path: str, base_url: str, batches, batch_size=1000, containment: bool = False):
+    """
+    It parses the JSON file at the input path into ready to send INSERT DATA
+    updates. It runs in a worker process of CollectionProcessor.uploadMany and
+    puts in batches, a bounded queue read by the uploader of the file, a pair 
+    for each update: the update and, if containment, the triples of its batch 
+    a ContainmentWriter needs. None is put at the end, even after an error.
+    Since the queue is bounded, the parsing waits for the uploads to catch up.
+    It returns the number of triples and the parsing seconds (without the waits)
+    """
+    seconds = 0.0
+    count = 0
+    try:
+        start = perf_counter()
+        for batch in iter_batches(iter_collection_triples(path, base_url), batch_size):
+            links = list(containment_triples(batch, base_url)) if containment else []
+            query = insert_data_query(batch)
+            count += len(batch)
+            seconds += perf_counter() - start
+            batches.put((query, links))
+            start = perf_counter()
+    finally:
+        batches.put(None)
+    return count, seconds
+
+
+def parsed_batches(batches, parsed):
+    #the pairs put in batches by parse_collection_file, until its end or the failure of its worker (parsed)
+    while True:
+        try:
+            item = batches.get(timeout=1)
+        except Empty:
+            if parsed.done():
+                return  # the worker process died before the end
+            continue
+        if item is None:
+            return
+        yield item
+
+
+def containment_triples(triples, base_url: str):
+    #the input triples read by ContainmentWriter: partOf, partOfCollection and the types of the containers
+    links = {URIRef(base_url + "partOf"), URIRef(base_url + "partOfCollection")}
+    containers = {URIRef(base_url + "Manifest"), URIRef(base_url + "Collection")}
+    for triple in triples:
+        if triple[1] in links or (triple[1] == RDF.type and triple[2] in containers):
+            yield triple
+
+
+class ContainmentWriter(object):
+    """
+    It writes in the Containment table of the relational database a (container, canvas)
+    row for each canvas of a manifest or a collection, read from the partOf and 
+    partOfCollection triples while they are uploaded. The rows are committed a chunk
+    at a time, as the triples are, and only the ids of the containers are kept in memory:
+    the old rows of a container are deleted with the first chunk it is met in.
+    The writers sharing lock (e.g. the uploaders of CollectionProcessor.uploadMany)
+    commit one at a time. The key of the table serves the lookups by container
+    """
+
+    def __init__(self, db_path: str, base_url: str, chunk_size: int = 10000, lock: Lock = None):
+        self.part_of = URIRef(base_url + "partOf")
+        self.part_of_collection = URIRef(base_url + "partOfCollection")
+        self.container_types = {URIRef(base_url + "Manifest"), URIRef(base_url + "Collection")}
+        self.chunk_size = chunk_size
+        self.lock = Lock() if lock is None else lock
+        self.containers = set()
+        self.cleared = []  # the containers met since the last chunk
+        self.rows = []
+        self.count = 0
+        self.con = connect(db_path, isolation_level=None)
+        try:
+            with self.lock:
+                create_table(self.con, "Containment", ("container", "canvas"), ("container", "canvas"))
+        except Exception:
+            self.con.close()
+            raise
+
+    def _container(self, container: str):
+        # the rows of an upload replace the ones of the previous upload of the same container
+        if container not in self.containers:
+            self.containers.add(container)
+            self.cleared.append(container)
+
+    def _flush(self):
+        if not self.rows and not self.cleared:
+            return
+        with self.lock:
+            self.con.execute("BEGIN IMMEDIATE")
+            try:
+                self.con.executemany(
+                    "DELETE FROM Containment WHERE container = ?", ((c,) for c in self.cleared)
+                )
+                self.con.executemany(
+                    "INSERT OR REPLACE INTO Containment (container, canvas) VALUES (?, ?)", self.rows
+                )
+                self.con.execute("COMMIT")
+            except Exception:
+                self.con.execute("ROLLBACK")
+                raise
+        self.count += len(self.rows)
+        self.cleared = []
+        self.rows = []
+
+    def add(self, triple):
+        s, p, o = triple
+        if p == RDF.type:
+            if o in self.container_types:
+                self._container(str(s))
+            return
+        # a manifest is typed before it is linked to its collection, a canvas never is
+        if p == self.part_of_collection or (p == self.part_of and str(s) not in self.containers):
+            self._container(str(o))
+            self.rows.append((str(o), str(s)))
+            if len(self.rows) >= self.chunk_size:
+                self._flush()
+
+    def passing(self, triples):
+        #pass the input triples through, adding each of them
+        for triple in triples:
+            self.add(triple)
+            yield triple
+
+    def commit(self) -> int:
+        #write the last rows, it returns the number of rows written
+        try:
+            self._flush()
+            with self.lock:
+                create_indexes(self.con, "Containment", [])
+        finally:
+            self.con.close()
+        return self.count
+
+    def rollback(self):
+        # the chunks already committed stay, as the batches of triples already uploaded do
+        self.con.close()
+
+
+class SparqlConnectionPool(object):
+    """
+    A pool of persistent (keep-alive) HTTP connections to a SPARQL endpoint
+    that can be shared between threads. At most size requests are in flight
+    at the same time: the other callers wait until a connection is free
+    """
+
+    def __init__(self, endpoint: str, size: int = 4, timeout: float = 60):
+        self.endpoint = endpoint
+        url = urlsplit(endpoint)
+        self.connection_class = HTTPSConnection if url.scheme == "https" else HTTPConnection
+        self.host = url.netloc
+        self.path = (url.path or "/") + ("?" + url.query if url.query else "")
+        self.timeout = timeout
+        self.idle = LifoQueue()
+        self.slots = BoundedSemaphore(size)
+
+    def _connect(self):
+        return self.connection_class(self.host, timeout=self.timeout)
+
+    def _request(self, connection, body: bytes, headers: dict):
+        connection.request("POST", self.path, body=body, headers=headers)
+        return connection.getresponse()
+
+    def _send(self, connection, body: bytes, headers: dict):
+        response = self._request(connection, body, headers)
+        # always read the whole body, otherwise the connection cannot be reused
+        data = response.read()
+        encoding = (response.getheader("Content-Encoding") or "").lower()
+        if encoding == "gzip":
+            data = gunzip(data)
+        elif encoding == "deflate":
+            data = inflate(data)
+        return response.status, data
+
+    def post(self, body: bytes, headers: dict) -> bytes:
+        """It posts the body to the endpoint and returns the content of the response"""
+        with self.slots:
+            try:
+                connection = self.idle.get_nowait()
+            except Empty:
+                connection = self._connect()
+            try:
+                try:
+                    status, data = self._send(connection, body, headers)
+                except (ConnectionError, HTTPException):
+                    # the server may have dropped an idle connection: retry on a new one
+                    connection.close()
+                    connection = self._connect()
+                    status, data = self._send(connection, body, headers)
+            except Exception:
+                connection.close()
+                raise
+            self.idle.put(connection)
+
+        if status >= 400:
+            raise HTTPException(
+                f"SPARQL endpoint returned {status}: {data[:200].decode(errors='replace')}"
+            )
+        return data
+
+    def update(self, query: str) -> bytes:
+        """It sends a SPARQL update to the endpoint"""
+        try:
+            return self.post(
+                urlencode({"update": query}).encode("utf-8"),
+                {"Content-Type": "application/x-www-form-urlencoded"},
+            )
+        finally:
+            bump_generation(self.endpoint)
+
+    def query(self, query: str) -> pd.DataFrame:
+        """
+        It runs a SPARQL SELECT query and returns its results in a data frame. 
+        The CSV response, compressed if the endpoint supports it, is parsed by the
+        columnar reader of pandas, so the result is the same of sparql_dataframe.get
+        without a new connection and a SPARQLWrapper for each query
+        """
+        data = self.post(
+            query.encode("utf-8"),
+            {
+                "Content-Type": "application/sparql-query",
+                "Accept": "text/csv",
+                "Accept-Encoding": "gzip, deflate",
+            },
+        )
+        return pd.read_csv(BytesIO(data), sep=",")
+
+    def stream(self, query: str, format: str = "json"):
+        """
+        It runs a SPARQL SELECT query and yields its results while they arrive: 
+        first the tuple of the variables, then a tuple of strings for each row, 
+        with None for the unbound variables. The JSON or TSV response is parsed 
+        incrementally, so only the rows not yet consumed by the caller are kept 
+        in memory. The connection stays busy until the rows are exhausted or 
+        the generator is closed
+        """
+        if format not in SPARQL_STREAM_FORMATS:
+            raise ValueError(f"Unknown SPARQL result format: {format}")
+        body = query.encode("utf-8")
+        headers = {
+            "Content-Type": "application/sparql-query",
+            "Accept": SPARQL_STREAM_FORMATS[format],
+            "Accept-Encoding": "gzip",
+        }
+
+        with self.slots:
+            try:
+                connection = self.idle.get_nowait()
+            except Empty:
+                connection = self._connect()
+            reusable = False
+            try:
+                try:
+                    response = self._request(connection, body, headers)
+                except (ConnectionError, HTTPException):
+                    connection.close()
+                    connection = self._connect()
+                    response = self._request(connection, body, headers)
+                if response.status >= 400:
+                    data = response.read()
+                    raise HTTPException(
+                        f"SPARQL endpoint returned {response.status}: {data[:200].decode(errors='replace')}"
+                    )
+
+                raw = response
+                if (response.getheader("Content-Encoding") or "").lower() == "gzip":
+                    raw = GzipFile(fileobj=response)
+                text = TextIOWrapper(raw, encoding="utf-8")
+                if format == "json":
+                    yield from iter_json_rows(JsonStream(text))
+                else:
+                    yield from iter_tsv_rows(text)
+
+                # what follows the results (e.g. a new line) must be read to reuse the connection
+                response.read()
+                reusable = True
+            finally:
+                # a response left half read (the caller stopped early) cannot be reused
+                if reusable:
+                    self.idle.put(connection)
+                else:
+                    connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Empty:
+                return
+
+
+# the result formats SparqlConnectionPool.stream can parse incrementally
+SPARQL_STREAM_FORMATS = {
+    "json": "application/sparql-results+json",
+    "tsv": "text/tab-separated-values",
+}
+
+# the escape sequences of the literals in a SPARQL TSV result
+TSV_ESCAPE = regex(r"\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)")
+TSV_ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f"}
+
+
+def unescape_tsv(match) -> str:
+    #the character written by an escape sequence of a TSV literal
+    code = match.group(1)
+    if len(code) > 1:
+        return chr(int(code[1:], 16))
+    return TSV_ESCAPES.get(code, code)
+
+
+def tsv_term_value(term: str):
+    """
+    It returns the value of an RDF term written in a SPARQL TSV result: the IRI 
+    without the angle brackets, the lexical form of a literal without its quotes, 
+    language tag and datatype, or None if the term is empty (an unbound variable)
+    """
+    if not term:
+        return None
+    if term[0] == "<" and term[-1] == ">":
+        return term[1:-1]
+    if term[0] == '"':
+        return TSV_ESCAPE.sub(unescape_tsv, term[1:term.rfind('"')])
+    # numbers and booleans in their abbreviated form, blank nodes
+    return term
+
+
+def iter_json_rows(stream: JsonStream):
+    """
+    It walks a SPARQL JSON result yielding the tuple of its variables 
+    and then the values of each binding as a tuple. The bindings are streamed
+    when the head comes first, as most endpoints write it: otherwise they
+    have to be kept until the variables are known
+    """
+    variables = None
+    early = []
+    for key in stream.iter_keys():
+        if key == "head":
+            variables = tuple(stream.value().get("vars", ()))
+            yield variables
+            for binding in early:
+                yield tuple(binding[name]["value"] if name in binding else None for name in variables)
+            early = None
+        elif key == "results":
+            for key in stream.iter_keys():
+                if key != "bindings":
+                    stream.value()
+                    continue
+                for _ in stream.iter_items():
+                    binding = stream.value()
+                    if variables is None:
+                        early.append(binding)
+                    else:
+                        yield tuple(binding[name]["value"] if name in binding else None for name in variables)
+        else:
+            stream.value()
+
+
+def iter_tsv_rows(lines):
+    """
+    It reads a SPARQL TSV result line by line yielding the tuple 
+    of its variables and then the values of each row as a tuple
+    """
+    lines = iter(lines)
+    header = next(lines, "").rstrip("\r\n")
+    variables = tuple(name.lstrip("?$") for name in header.split("\t")) if header else ()
+    yield variables
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if line:
+            yield tuple(tsv_term_value(term) for term in line.split("\t"))
+
+
+def row_chunks(rows, chunk_size: int):
+    """
+    It groups the rows yielded by SparqlConnectionPool.stream into data frames 
+    of chunk_size rows, the last one possibly shorter. An empty result gives 
+    one empty data frame, so that the columns are known anyway
+    """
+    try:
+        columns = list(next(rows))
+        empty = True
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            empty = False
+            yield pd.DataFrame(chunk, columns=columns)
+        if empty:
+            yield pd.DataFrame(columns=columns)
+    finally:
+        rows.close()
+
+
+# the connection pools shared by all the processors, one for each SPARQL endpoint
+SPARQL_POOLS = {}
+SPARQL_POOLS_LOCK = Lock()
+
+
+def sparql_pool(endpoint: str, size: int = 16) -> SparqlConnectionPool:
+    #the shared pool of keep-alive connections to the endpoint
+    with SPARQL_POOLS_LOCK:
+        pool = SPARQL_POOLS.get(endpoint)
+        if pool is None:
+            pool = SPARQL_POOLS[endpoint] = SparqlConnectionPool(endpoint, size)
+        return pool
+
+
+# pragmas of RelationalQueryProcessor in read optimized mode: WAL lets readers run
+# alongside writers, mmap and a large page cache keep hot pages in memory
+READ_OPTIMIZED_PRAGMAS = {
+    "journal_mode": "WAL",
+    "mmap_size": 268435456,  # 256 MB
+    "cache_size": -65536,  # 64 MB
+    "temp_store": "MEMORY",
+    "query_only": "ON",
+}
+
+
+class SQLiteConnectionPool(object):
+    """
+    It keeps one open connection per thread to the same SQLite database,
+    so that repeated queries do not pay the connection setup and find a warm
+    page cache. The connections of the threads that have finished are closed
+    when a new one is opened, and all of them can be closed at once with close
+    """
+
+    def __init__(self, db_path: str, pragmas: dict = None):
+        self.db_path = db_path
+        self.pragmas = dict() if pragmas is None else pragmas
+        self.local = local()
+        self.lock = Lock()
+        # the open connections by the thread using them
+        self.opened = {}
+        # the connection reading PRAGMA data_version for changed, and the last value it read
+        self.watcher = None
+        self.data_version = None
+
+    def get(self) -> sqlite3.Connection:
+        """It returns the connection of the calling thread, opening it if needed"""
+        con = getattr(self.local, "connection", None)
+        if con is None:
+            # check_same_thread is off only to let other threads close it,
+            # each connection is still used by the thread that opened it
+            con = sqlite3.connect(self.db_path, check_same_thread=False)
+            for name, value in self.pragmas.items():
+                con.execute(f"PRAGMA {name} = {value}")
+            self.local.connection = con
+            with self.lock:
+                self._close_finished()
+                self.opened[current_thread()] = con
+        return con
+
+    def _close_finished(self):
+        # e.g. the threads of a thread-per-request server or of a replaced executor
+        for thread in [thread for thread in self.opened if not thread.is_alive()]:
+            self.opened.pop(thread).close()
+
+    def changed(self) -> bool:
+        """
+        It tells whether some other connection committed changes to the database 
+        since the last call, from any thread, using PRAGMA data_version. Its value
+        only compares across the reads of one connection, so all of them are made 
+        on the same connection, whatever the thread. It returns True on the first 
+        call after the pool is opened or closed, when it cannot know
+        """
+        self.get()  # its pragmas (e.g. journal_mode) are set before the first read
+        with self.lock:
+            if self.watcher is None:
+                self.watcher = sqlite3.connect(self.db_path, check_same_thread=False)
+            version = self.watcher.execute("PRAGMA data_version").fetchone()[0]
+            changed = version != self.data_version
+            self.data_version = version
+        return changed
+
+    def close(self):
+        with self.lock:
+            for con in self.opened.values():
+                con.close()
+            self.opened = {}
+            self.local = local()
+            if self.watcher is not None:
+                self.watcher.close()
+            self.watcher = None
+            self.data_version = None
+
+
+#==============EMBEDDED TRIPLESTORE==============
+
+# pragmas of the SQLite file of a LocalTriplestore: WAL lets the queries run alongside an upload
+LOCAL_TRIPLESTORE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,  # 256 MB
+    "cache_size": -65536,  # 64 MB
+}
+
+# the primary key finds the triples by subject (and predicate), the index by predicate
+# (and object): these are the only access paths of the fixed shapes of the graph
+# queries, e.g. "?s rdf:type rumi:Canvas", "?s schema:identifier ?id", "?c rumi:items ?m"
+LOCAL_TRIPLESTORE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS triples (
+        s TEXT NOT NULL,
+        p TEXT NOT NULL,
+        o TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        PRIMARY KEY (s, p, o, kind)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS triples_pos ON triples (p, o, kind, s);
+"""
+
+
+def encode_node(term) -> str:
+    #the text of an IRI or a blank node in the local triplestore
+    return "_:" + term if isinstance(term, BNode) else str(term)
+
+
+def decode_node(text: str):
+    return BNode(text[2:]) if text.startswith("_:") else URIRef(text)
+
+
+def encode_object(term) -> tuple:
+    """
+    It returns the text of the object of a triple and its kind: empty for an IRI
+    or a blank node, '"' for a plain literal, "@" and the language for a language
+    tagged literal, "^^" and the datatype for a typed literal
+    """
+    if isinstance(term, Literal):
+        if term.language:
+            return str(term), "@" + term.language
+        if term.datatype is not None:
+            return str(term), "^^" + str(term.datatype)
+        return str(term), '"'
+    return encode_node(term), ""
+
+
+def decode_object(text: str, kind: str):
+    if not kind:
+        return decode_node(text)
+    if kind == '"':
+        return Literal(text)
+    if kind[0] == "@":
+        return Literal(text, lang=kind[1:])
+    return Literal(text, datatype=URIRef(kind[2:]))
+
+
+class SQLiteTripleStore(Store):
+    """
+    An rdflib store keeping the triples of one graph in a SQLite file, so that
+    the SPARQL engine of rdflib can query them in-process. Each thread uses its
+    own connection of the input pool
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, connections: SQLiteConnectionPool):
+        super().__init__()
+        self.connections = connections
+
+    def _where(self, triple):
+        # the WHERE clause of a triple pattern, None if no stored triple can match it
+        s, p, o = triple
+        clauses = []
+        params = []
+        if s is not None:
+            if isinstance(s, Literal):
+                return None
+            clauses.append("s = ?")
+            params.append(encode_node(s))
+        if p is not None:
+            if not isinstance(p, URIRef):
+                return None
+            clauses.append("p = ?")
+            params.append(str(p))
+        if o is not None:
+            clauses.append("o = ? AND kind = ?")
+            params.extend(encode_object(o))
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def add(self, triple, context=None, quoted=False):
+        self.addN([(*triple, context)])
+
+    def addN(self, quads):
+        self.connections.get().executemany(
+            "INSERT OR IGNORE INTO triples VALUES (?, ?, ?, ?)",
+            ((encode_node(s), str(p), *encode_object(o)) for s, p, o, _ in quads),
+        )
+
+    def remove(self, triple, context=None):
+        where = self._where(triple)
+        if where is not None:
+            self.connections.get().execute("DELETE FROM triples" + where[0], where[1])
+
+    def triples(self, triple, context=None):
+        where = self._where(triple)
+        if where is None:
+            return
+        rows = self.connections.get().execute("SELECT s, p, o, kind FROM triples" + where[0], where[1])
+        for s, p, o, kind in rows:
+            yield (decode_node(s), URIRef(p), decode_object(o, kind)), iter(())
+
+    def __len__(self, context=None):
+        return self.connections.get().execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+
 
-        graph.add((manifest_id, RDFS.label, Literal(str(manifest_label_value))))
+# the SPARQL parser of rdflib is not thread safe
+PARSING_LOCK = Lock()
 
-    #populate canvas
-        for canvas in manifest['items']:
-            canvas_id = URIRef(canvas['id'])
 
-            graph.add((manifest_id, prop_items, canvas_id))
-            graph.add((canvas_id, prop_id, Literal(canvas['id'])))
-            graph.add((canvas_id, RDF.type, type_canvas))
+@lru_cache(maxsize=256)
+def prepared_query(query: str):
+    #the parsed SPARQL query, parsing takes rdflib longer than running the query
+    with PARSING_LOCK:
+        return prepareQuery(query)
 
-            canvas_label_list = list(canvas['label'].values())
-            canvas_label_value = canvas_label_list[0][0]
-            canvas_label_value = remove_invalid_char(str(canvas_label_value))
 
-            graph.add((canvas_id, RDFS.label, Literal(str(canvas_label_value))))
+class LocalTriplestore(object):
+    """
+    A graph database stored in a local SQLite file and queried in-process, used
+    by the graph processors when their path is not the URL of a SPARQL endpoint.
+    It offers query, stream and update as SparqlConnectionPool does, and insert
+    to add triples without writing and parsing SPARQL updates. The writes are
+    serialized, the queries of different threads run alongside them
+    """
+
+    def __init__(self, path: str):
+        self.endpoint = abspath(path)
+        self.connections = SQLiteConnectionPool(self.endpoint, LOCAL_TRIPLESTORE_PRAGMAS)
+        self.connections.get().executescript(LOCAL_TRIPLESTORE_SCHEMA)
+        self.graph = Graph(store=SQLiteTripleStore(self.connections))
+        self.lock = Lock()
+
+    def insert(self, triples) -> int:
+        """It adds the input triples to the graph and returns how many they were"""
+        triples = list(triples)
+        with self.lock:
+            con = self.connections.get()
+            try:
+                self.graph.addN((s, p, o, self.graph) for s, p, o in triples)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            finally:
+                bump_generation(self.endpoint)
+        return len(triples)
+
+    def update(self, query: str):
+        """It runs a SPARQL update on the graph"""
+        with PARSING_LOCK:
+            update = prepareUpdate(query)
+        with self.lock:
+            con = self.connections.get()
+            try:
+                self.graph.update(update)
+                con.commit()
+            except Exception:
+                con.rollback()
+                raise
+            finally:
+                bump_generation(self.endpoint)
+
+    def query(self, query: str) -> pd.DataFrame:
+        """
+        It runs a SPARQL SELECT query and returns its results in a data frame, 
+        read from their CSV serialization as the results of a SPARQL endpoint are
+        """
+        result = self.graph.query(prepared_query(query))
+        return pd.read_csv(BytesIO(result.serialize(format="csv")), sep=",")
+
+    def stream(self, query: str, format: str = "json"):
+        """
+        It runs a SPARQL SELECT query and yields its results as SparqlConnectionPool.stream 
+        does: the tuple of the variables, then a tuple of strings for each row. 
+        There is no response to parse, so the format is ignored
+        """
+        result = self.graph.query(prepared_query(query))
+        yield tuple(str(name) for name in result.vars)
+        for row in result:
+            yield tuple(None if value is None else str(value) for value in row)
+
+    def close(self):
+        self.connections.close()
+
+
+# the local triplestores opened by this process, one for each file
+LOCAL_TRIPLESTORES = {}
+LOCAL_TRIPLESTORES_LOCK = Lock()
+
+
+def is_sparql_endpoint(path_or_url: str) -> bool:
+    return urlsplit(path_or_url).scheme in ("http", "https")
+
+
+def triplestore(path_or_url: str):
+    """
+    It returns the shared connection pool of the SPARQL endpoint at the input URL,
+    or the LocalTriplestore in the file at the input path
+    """
+    if is_sparql_endpoint(path_or_url):
+        return sparql_pool(path_or_url)
+    path = abspath(path_or_url)
+    with LOCAL_TRIPLESTORES_LOCK:
+        store = LOCAL_TRIPLESTORES.get(path)
+        if store is None:
+            store = LOCAL_TRIPLESTORES[path] = LocalTriplestore(path)
+        return store
+
+
+def cached_result(method):
+    """
+    A decorator for the query methods of RelationalQueryProcessor: their results
+    are kept in the result cache of the processor by method name and arguments
+    """
+    signature = inspect.signature(method)
+
+    @wraps(method)
+    def cached(self, *args, **kwargs):
+        # positional and keyword arguments naming the same call give the same key
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(bound.arguments.items())[1:]
+        return self.cachedQuery(method.__name__, key, lambda: method(*bound.args, **bound.kwargs))
+    return cached
+
 
 class Processor(object):
     """
@@ -117,7 +1331,80 @@ class QueryProcessor(Processor):
 #=======RELATIONAL DATADASE=========
 
 
-class MetadataProcessor(Processor):
+class RelationalProcessor(Processor):
+    """
+    The base class of the processors uploading CSV files in the relational
+    database. The files are read in chunks of chunkSize rows and loaded
+    in one single transaction
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.chunkSize = 100000
+        self.incremental = True
+        self.uploadStats = dict()
+
+    def isIncremental(self) -> bool:
+        return self.incremental
+
+    def setIncremental(self, incremental: bool) -> bool:
+        """
+        When incremental (the default), uploadData returns immediately
+        for the files that did not change since their last upload
+        """
+        self.incremental = bool(incremental)
+        return True
+
+    def getChunkSize(self) -> int:
+        return self.chunkSize
+
+    def setChunkSize(self, chunk_size: int) -> bool:
+        if not isinstance(chunk_size, int) or chunk_size <= 0:
+            return False
+        self.chunkSize = chunk_size
+        return True
+
+    def getUploadStats(self) -> dict:
+        """
+        It returns the statistics of the last upload (skipped, rows, seconds,
+        rows_per_second and process_peak_memory, the peak resident memory
+        reached by the whole process so far, in bytes)
+        """
+        return self.uploadStats
+
+    def getUploadState(self, path: str) -> dict:
+        """
+        It returns the mtime, size and hash the file at the input path had when
+        it was last uploaded by this kind of processor, or None
+        """
+        return read_upload_state(self.dbPathOrUrl, type(self).__name__, path)
+
+    def recordUpload(self, path: str, state: dict):
+        write_upload_state(self.dbPathOrUrl, type(self).__name__, path, state)
+
+    def uploadCSV(self, path: str, dtype: dict, tables: dict) -> bool:
+        try:
+            start = perf_counter()
+            known = self.getUploadState(path)
+            state = file_state(path, known)
+            if self.incremental and known is not None and known["hash"] == state["hash"]:
+                if known["mtime"] != state["mtime"]:
+                    self.recordUpload(path, state)  # touched but not changed
+                self.uploadStats = {"skipped": True, "rows": 0, "seconds": perf_counter() - start}
+                return True
+
+            self.uploadStats = upload_csv_to_db(
+                self.dbPathOrUrl, path, dtype, tables, self.chunkSize
+            )
+            self.uploadStats["skipped"] = False
+            self.recordUpload(path, state)
+            return True
+        except Exception as e:
+            print(f"Upload failed: {str(e)}")
+            return False
+
+
+class MetadataProcessor(RelationalProcessor):
     """
     It takes in input the path of a CSV file containing metadata 
     and uploads them in the database.
@@ -125,16 +1412,26 @@ class MetadataProcessor(Processor):
     to upload metadata in the database
     """
 
+    TABLES = {
+        "Metadata": {"rows": lambda chunk: chunk, "key": ("id",), "indexes": []},
+        # the creators of an entity are replaced together with its metadata
+        "Creators": {
+            "rows": split_creators,
+            "key": ("entity_id", "creator"),
+            "replace": ("entity_id", "id"),
+            "indexes": [("creator", "entity_id")],
+        },
+    }
+
     def uploadData(self, path: str) -> bool:
-        metadata = pd.read_csv(
+        return self.uploadCSV(
             path,
-            keep_default_na=False,
-            dtype={"id": "string", "title": "string", "creator": "string"},
+            {"id": "string", "title": "string", "creator": "string"},
+            self.TABLES,
         )
-        return upload_to_db(self.dbPathOrUrl, metadata, "Metadata")
 
 
-class AnnotationProcessor(Processor):
+class AnnotationProcessor(RelationalProcessor):
     """
     It takes in input the path of a CSV file containing annotations 
     and uploads them in the database.
@@ -142,22 +1439,121 @@ class AnnotationProcessor(Processor):
     to upload annotations in the database
     """
 
+    TABLES = {
+        "Annotations": {
+            "rows": lambda chunk: chunk,
+            "key": ("id",),
+            # (body, target) also serves the lookups by body alone
+            "indexes": [("target",), ("body", "target")],
+        },
+    }
+
     def uploadData(self, path: str) -> bool:
-        annotations = pd.read_csv(
+        return self.uploadCSV(
             path,
-            keep_default_na=False,
-            dtype={
+            {
                 "id": "string",
                 "body": "string",
                 "target": "string",
                 "motivation": "string",
             },
+            self.TABLES,
         )
-        return upload_to_db(self.dbPathOrUrl, annotations, "Annotations")
 
 
 # Done by Evgeniia
 class RelationalQueryProcessor(QueryProcessor):
+
+    def __init__(self):
+        super().__init__()
+        self.readOptimized = False
+        self.connections = None
+        # the results are valid while the database keeps the same generation
+        self.cache = ResultCache(size=256, ttl=None)
+        self.generation = 0
+        self.generationLock = Lock()
+
+    def setDbPathOrUrl(self, pathOrUrl: str) -> bool:
+        self.close()
+        self.dbPathOrUrl = pathOrUrl
+        self.connections = SQLiteConnectionPool(pathOrUrl, self.getPragmas())
+        self.cache.clear()
+        return True
+
+    def isReadOptimized(self) -> bool:
+        return self.readOptimized
+
+    def setReadOptimized(self, read_optimized: bool) -> bool:
+        """
+        It turns on or off the read optimized mode (WAL journal, memory mapping,
+        large page cache and query_only connections). The already open
+        connections are closed so that the new pragmas apply
+        """
+        self.readOptimized = bool(read_optimized)
+        if self.dbPathOrUrl is not None:
+            self.setDbPathOrUrl(self.dbPathOrUrl)
+        return True
+
+    def getPragmas(self) -> dict:
+        return READ_OPTIMIZED_PRAGMAS if self.readOptimized else dict()
+
+    def getConnection(self) -> sqlite3.Connection:
+        """
+        It returns the connection to the database of the calling thread,
+        which stays open until close is called
+        """
+        return self.connections.get()
+
+    def close(self) -> bool:
+        """It closes all the connections opened by the processor"""
+        if self.connections is not None:
+            self.connections.close()
+        return True
+
+    def getCacheSize(self) -> int:
+        return self.cache.size
+
+    def setCacheSize(self, size: int) -> bool:
+        #the number of query results kept, 0 turns the cache off
+        if isinstance(size, int) and size >= 0:
+            self.cache.resize(size)
+            return True
+        else:
+            print("The cache size must be a non negative integer")
+            return False
+
+    def getCacheStats(self) -> dict:
+        return self.cache.stats()
+
+    def clearCache(self):
+        self.cache.clear()
+
+    def cachedQuery(self, method: str, args: tuple, run) -> pd.DataFrame:
+        """
+        It returns the result of run, the function running the query of the input 
+        method with the input arguments, or the cached one if the database was not 
+        changed since it was computed. Any commit made by another connection, 
+        e.g. by AnnotationProcessor or MetadataProcessor, changes PRAGMA data_version
+        and so starts a new generation of results, while new threads do not
+        """
+
+        if self.connections.changed():
+            with self.generationLock:
+                self.generation += 1
+        generation = self.generation
+        key = (method, args)
+        try:
+            hash(key)
+        except TypeError:
+            return run()
+
+        result = self.cache.get(key, generation)
+        if result is None:
+            result = run()
+            self.cache.put(key, generation, result)
+
+        # a copy, so that the callers cannot change the cached data frame
+        return result.copy()
     
     def getAllAnnotations(self):
         """
@@ -165,7 +1561,7 @@ class RelationalQueryProcessor(QueryProcessor):
         included in the database
         """
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
+        with self.getConnection() as con:
             query = "SELECT * FROM annotations"
             result = pd.read_sql(query, con)
         return result
@@ -177,12 +1573,13 @@ class RelationalQueryProcessor(QueryProcessor):
         included in the database
         """
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
+        with self.getConnection() as con:
             query = "SELECT body FROM annotations"
             result = pd.read_sql(query, con)
         return result
     
     
+    @cached_result
     def getAnnotationsWithBody(self, body):
         """
         It returns a data frame containing all the annotations 
@@ -190,12 +1587,13 @@ class RelationalQueryProcessor(QueryProcessor):
         the entity specified by the input identifier
         """
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
+        with self.getConnection() as con:
             query = "SELECT * FROM annotations WHERE body = ?"
             result = pd.read_sql(query, con, params=(body,))
         return result
 
     
+    @cached_result
     def getAnnotationsWithBodyAndTarget(self, body, target):
         """
         It returns a data frame containing all the annotations 
@@ -203,7 +1601,7 @@ class RelationalQueryProcessor(QueryProcessor):
         the entities specified by the input identifiers
         """
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
+        with self.getConnection() as con:
             query = "SELECT * FROM annotations WHERE body = ? AND target = ?"
             result = pd.read_sql(
                 query,
@@ -216,6 +1614,7 @@ class RelationalQueryProcessor(QueryProcessor):
         return result
 
     
+    @cached_result
     def getAnnotationsWithTarget(self, target):
         """
         It returns a data frame containing all the annotations 
@@ -223,20 +1622,74 @@ class RelationalQueryProcessor(QueryProcessor):
         the entity specified by the input identifier
         """
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
+        with self.getConnection() as con:
             query = "SELECT * FROM annotations WHERE target = ?"
             result = pd.read_sql(query, con, params=(target,))
         return result
 
     
+    @cached_result
+    def getAnnotationsInCollection(self, collection):
+        """
+        It returns a data frame containing all the annotations included in the
+        database that have, as annotation target, a canvas of the collection
+        specified by the input identifier, in one join with the Containment 
+        table written by CollectionProcessor
+        """
+
+        return self.getAnnotationsInContainer(collection)
+
+    @cached_result
+    def getAnnotationsInManifest(self, manifest):
+        """
+        It returns a data frame containing all the annotations included in the
+        database that have, as annotation target, a canvas of the manifest
+        specified by the input identifier, in one join with the Containment 
+        table written by CollectionProcessor
+        """
+
+        return self.getAnnotationsInContainer(manifest)
+
+    def hasContainment(self) -> bool:
+        #whether the database has the Containment table, written by CollectionProcessor.setRelationalDbPath
+        with self.getConnection() as con:
+            return has_table(con, "Containment")
+
+    def getAnnotationsInContainer(self, container):
+        if not self.hasContainment():
+            raise ValueError(
+                "The Containment table is missing: upload the collections "
+                "with CollectionProcessor.setRelationalDbPath set to this database"
+            )
+        with self.getConnection() as con:
+            query = """
+                SELECT a.* FROM containment AS c JOIN annotations AS a ON a.target = c.canvas
+                WHERE c.container = ?
+            """
+            result = pd.read_sql(query, con, params=(container,))
+        return result
+
+    @cached_result
     def getEntitiesWithCreator(self, creator):
         """
         It returns a data frame containing all the metadata included in the database
         related to the entities having the input creator as one of their creators
         """
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT DISTINCT id, title, creator FROM metadata WHERE creator = ?"
+        with self.getConnection() as con:
+            if not has_table(con, "Creators"):
+                # a database loaded before the Creators table existed: scan the metadata
+                query = "SELECT id, title, creator FROM metadata WHERE creator LIKE ?"
+                result = pd.read_sql(query, con, params=(f"%{creator}%",))
+                matching = split_creators(result)
+                result = result[result["id"].isin(matching.loc[matching["creator"] == creator, "entity_id"])]
+                return result.reset_index(drop=True)
+            # the Creators table holds one row per creator, so this is an index lookup
+            query = """
+                SELECT m.id, m.title, m.creator
+                FROM creators AS c JOIN metadata AS m ON m.id = c.entity_id
+                WHERE c.creator = ?
+            """
             result = pd.read_sql(query, con, params=(creator,))
         return result
 
@@ -250,7 +1703,7 @@ class RelationalQueryProcessor(QueryProcessor):
         if not isinstance(type, str):
             return pd.DataFrame()
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
+        with self.getConnection() as con:
 
             if type == 'image':
                 query = "SELECT body AS id FROM annotations"
@@ -267,17 +1720,19 @@ class RelationalQueryProcessor(QueryProcessor):
         return result
 
     
+    @cached_result
     def getEntitiesWithTitle(self, title):
         """
         It returns a data frame containing all the metadata included in the database
         related to the entities having, as title, the input title
         """
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
-            query = "SELECT DISTINCT id, title, creator FROM metadata WHERE title = ?"
+        with self.getConnection() as con:
+            query = "SELECT id, title, creator FROM metadata WHERE title = ?"
             result = pd.read_sql(query, con, params=(title,))
         return result
 
+    @cached_result
     def getEntityById(self, id):
         """
         It returns a data frame containing an entity identified 
@@ -286,7 +1741,7 @@ class RelationalQueryProcessor(QueryProcessor):
         if not isinstance(id, str):
             return pd.DataFrame()
 
-        with sqlite3.connect(self.dbPathOrUrl) as con:
+        with self.getConnection() as con:
             # search in the metadata table
             query = "SELECT id, title, creator FROM metadata WHERE id = ?"
             cursor = con.cursor()
@@ -314,49 +1769,308 @@ class RelationalQueryProcessor(QueryProcessor):
 
         return result
 
+    def getEntitiesByIds(self, ids):
+        """
+        It returns a data frame containing the entities identified by any of
+        the input identifiers. The identifiers are passed as one JSON array,
+        so each table is searched with a single indexed query whatever their number
+        """
+        ids_json = dumps([str(entity_id) for entity_id in ids])
+
+        with self.getConnection() as con:
+            query = "SELECT id, title, creator FROM metadata WHERE id IN (SELECT value FROM json_each(?))"
+            metadata_df = pd.read_sql(query, con, params=(ids_json,))
+
+            query = """
+                SELECT id, body, target, motivation FROM annotations
+                WHERE id IN (SELECT value FROM json_each(?))
+            """
+            annotations_df = pd.read_sql(query, con, params=(ids_json,))
+
+        frames = [df for df in (metadata_df, annotations_df) if not df.empty]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
 
 #=======GRAPH DATADASE=========
 
 # Done by Evan
+# the parsed updates of a file waiting to be sent by CollectionProcessor.uploadMany
+BATCHES_IN_FLIGHT = 4
+
+
 class CollectionProcessor(Processor):
     """
     It takes in input the path of a JSON file and uploads them 
     in the graph database
     """
 
+    BASE_URL = "https://github.com/mjavadf/rumi_group_project/"  # "D:/Projects/rumi_group_project"
+    # the layout of the uploaded triples: the files uploaded with an older one are uploaded again
+    # (2: the partOf and partOfCollection triples, inverse of items)
+    GRAPH_VERSION = 2
+
     def __init__(self):
         super().__init__()
+        self.batchSize = 1000
+        self.incremental = True
+        self.uploadStats = dict()
+        self.relationalDbPath = None
 
-    def uploadData(self, path: str):
-        try:
-            base_url = "https://github.com/mjavadf/rumi_group_project/"  # "D:/Projects/rumi_group_project"
-            new_graph = Graph()
+    def isIncremental(self) -> bool:
+        return self.incremental
+
+    def setIncremental(self, incremental: bool) -> bool:
+        """
+        When incremental (the default), uploadData returns immediately
+        for the files that did not change since their last upload
+        """
+        self.incremental = bool(incremental)
+        return True
 
-            with open(path, mode="r", encoding="utf-8") as j:
-                json_obj = load(j)
+    def getBatchSize(self) -> int:
+        return self.batchSize
 
-            # this check the loaded json file
-            if type(json_obj) is list:
-                for collection in json_obj:
-                    create_graph(collection, base_url, new_graph)
-            else:
-                create_graph(json_obj, base_url, new_graph)
+    def setBatchSize(self, batch_size: int) -> bool:
+        """
+        It sets how many triples are sent in each INSERT DATA request.
+        None or 0 means that the whole file is sent in one single request
+        """
+        if batch_size is not None and (not isinstance(batch_size, int) or batch_size < 0):
+            return False
+        self.batchSize = batch_size
+        return True
+
+    def getUploadStats(self) -> dict:
+        """
+        It returns the statistics of the last upload (skipped, triples, requests,
+        seconds and triples_per_second), useful to tune the batch size
+        """
+        return self.uploadStats
+
+    def getRelationalDbPath(self) -> str:
+        return self.relationalDbPath
+
+    def setRelationalDbPath(self, path: str) -> bool:
+        """
+        It sets the relational database where the uploads also write the canvases 
+        contained in each collection and manifest (the Containment table), used 
+        by getAnnotationsInCollection and getAnnotationsInManifest. 
+        None (the default) stops writing it
+        """
+        if path is not None and not isinstance(path, str):
+            print("The relational database path must be a string or None")
+            return False
+        self.relationalDbPath = path
+        return True
+
+    def isMirrored(self, path: str, state: dict) -> bool:
+        #whether the containment of the file, in its current state, is in the relational database (if any)
+        if self.relationalDbPath is None:
+            return True
+        known = read_upload_state(self.relationalDbPath, type(self).__name__, path)
+        return known is not None and known["hash"] == state["hash"]
+
+    def mirrorContainment(self, path: str, state: dict, writer: ContainmentWriter) -> int:
+        #commit the containment of the file written by writer and record it
+        count = writer.commit()
+        with writer.lock:
+            write_upload_state(self.relationalDbPath, type(self).__name__, path, state)
+        return count
+
+    def uploadSubject(self, path: str) -> URIRef:
+        # the upload records are kept in the graph database itself, so they go away with its data
+        return URIRef(self.BASE_URL + "upload/" + sha1(abspath(path).encode("utf-8")).hexdigest())
+
+    def getUploadState(self, path: str) -> dict:
+        """
+        It returns the mtime, size and hash the file at the input path had
+        when it was last uploaded in the graph database, with the GRAPH_VERSION
+        of that upload, or None
+        """
+        query = f"""
+            PREFIX rumi: <{self.BASE_URL}>
+            SELECT ?mtime ?size ?hash ?version
+            WHERE {{
+                {self.uploadSubject(path).n3()} rumi:mtime ?mtime ;
+                    rumi:size ?size ;
+                    rumi:contentHash ?hash .
+                OPTIONAL {{ {self.uploadSubject(path).n3()} rumi:graphVersion ?version }}
+            }}
+            """
+        df = triplestore(self.getDbPathOrUrl()).query(query)
+        if df.empty:
+            return None
+        row = df.iloc[0]
+        version = 1 if pd.isna(row["version"]) else int(row["version"])
+        return {"mtime": int(row["mtime"]), "size": int(row["size"]), "hash": str(row["hash"]), "version": version}
+
+    def recordUploadQuery(self, path: str, state: dict) -> str:
+        subject = self.uploadSubject(path)
+        triples = [
+            (subject, URIRef(self.BASE_URL + "sourcePath"), Literal(abspath(path))),
+            (subject, URIRef(self.BASE_URL + "mtime"), Literal(state["mtime"])),
+            (subject, URIRef(self.BASE_URL + "size"), Literal(state["size"])),
+            (subject, URIRef(self.BASE_URL + "contentHash"), Literal(state["hash"])),
+            (subject, URIRef(self.BASE_URL + "graphVersion"), Literal(self.GRAPH_VERSION)),
+        ]
+        return f"DELETE WHERE {{ {subject.n3()} ?p ?o }} ;\n" + insert_data_query(triples)
+
+    def isUnchanged(self, path: str):
+        """
+        It returns whether the file at the input path did not change since its
+        last upload, together with the current state of the file and, if the
+        file was only touched, the update refreshing its record
+        """
+        known = self.getUploadState(path)
+        state = file_state(path, known)
+        unchanged = (
+            known is not None
+            and known["hash"] == state["hash"]
+            and known["version"] == self.GRAPH_VERSION
+        )
+        refresh = None
+        if unchanged and known["mtime"] != state["mtime"]:
+            refresh = self.recordUploadQuery(path, state)
+        return unchanged, state, refresh
 
-            store = SPARQLUpdateStore()
+    def uploadData(self, path: str):
+        try:
+            base_url = self.BASE_URL
             endpoint = self.getDbPathOrUrl()
-            store.open((endpoint, endpoint))
-            for triple in new_graph.triples((None, None, None)):
-                store.add(triple)
-            store.close()
 
-            # delete below comment in case we want to visualize a turtle file from the Collections
-            # new_graph.serialize(destination="Turtle_Visualization.ttl", format="turtle")
+            start = perf_counter()
+            unchanged, state, refresh = self.isUnchanged(path)
+            if self.incremental and unchanged and self.isMirrored(path, state):
+                if refresh is not None:
+                    upload_update(endpoint, refresh)
+                self.uploadStats = {"skipped": True, "triples": 0, "seconds": perf_counter() - start}
+                return True
+
+            # the triples are streamed from the file straight into the batched upload,
+            # so memory depends on the batch size and not on the size of the file
+            triples = iter_collection_triples(path, base_url)
+            writer = None
+            if self.relationalDbPath is not None:
+                # the containment is written in the relational database along with the upload
+                writer = ContainmentWriter(self.relationalDbPath, base_url)
+                triples = writer.passing(triples)
+            try:
+                self.uploadStats = upload_triples(endpoint, triples, self.batchSize)
+                self.uploadStats["skipped"] = False
+                upload_update(endpoint, self.recordUploadQuery(path, state))
+            except Exception:
+                if writer is not None:
+                    writer.rollback()
+                raise
+            if writer is not None:
+                self.uploadStats["containment"] = self.mirrorContainment(path, state, writer)
+
+            # uncomment below in case we want to visualize a turtle file from the Collections
+            # create_graph(path, base_url).serialize(destination="Turtle_Visualization.ttl", format="turtle")
             return True
 
         except Exception as e:
             print(f"Upload failed: {str(e)}")
             return False
 
+    def uploadOne(self, path: str) -> dict:
+        #upload one file with uploadData, reporting it as uploadMany does
+        success = self.uploadData(path)
+        stats = self.uploadStats if success else dict()
+        return {"path": path, "success": success, "skipped": stats.get("skipped", False),
+                "triples": stats.get("triples", 0), "parse_seconds": 0.0,
+                "upload_seconds": stats.get("seconds", 0.0)}
+
+    def uploadMany(self, paths: list, workers: int = None, connections: int = 4) -> list:
+        """
+        It uploads several JSON files in the graph database. The files are parsed
+        in parallel by workers processes (by default one per CPU) while the updates
+        are sent by at most connections threads sharing a pool of keep-alive
+        connections. Each parsed update is sent while the file is still being parsed:
+        to bound memory, each file has at most BATCHES_IN_FLIGHT updates waiting
+        to be sent, and no more than 2 * workers files are in flight.
+        It returns, for each input path in order, a dictionary with the path,
+        the success, whether it was skipped because unchanged, the number of
+        triples and the parse and upload seconds. A local triplestore has one
+        writer only, so its files are uploaded one after the other
+        """
+        if not is_sparql_endpoint(self.getDbPathOrUrl()):
+            return [self.uploadOne(path) for path in paths]
+
+        base_url = self.BASE_URL
+        workers = workers or cpu_count() or 1
+        mirrored = self.relationalDbPath is not None
+        waiting = BoundedSemaphore(2 * workers)
+        pool = SparqlConnectionPool(self.getDbPathOrUrl(), connections)
+        results = [None] * len(paths)
+        # the uploaders write the containment in the relational database one at a time
+        mirroring = Lock()
+
+        def upload(index, state, batches, parsed):
+            path = paths[index]
+            result = {"path": path, "success": False, "skipped": False, "triples": 0,
+                      "parse_seconds": 0.0, "upload_seconds": 0.0}
+            writer = None
+            received = parsed_batches(batches, parsed)
+            try:
+                if mirrored:
+                    writer = ContainmentWriter(self.relationalDbPath, base_url, lock=mirroring)
+                start = perf_counter()
+                for query, links in received:
+                    pool.update(query)
+                    if writer is not None:
+                        for triple in links:
+                            writer.add(triple)
+                result["triples"], result["parse_seconds"] = parsed.result()
+                pool.update(self.recordUploadQuery(path, state))
+                if writer is not None:
+                    self.mirrorContainment(path, state, writer)
+                    writer = None
+                result["upload_seconds"] = perf_counter() - start
+                result["success"] = True
+            except Exception as e:
+                print(f"Upload of {path} failed: {str(e)}")
+            finally:
+                if writer is not None:
+                    writer.rollback()
+                # the parser waits on the queue until its batches are taken
+                for _ in received:
+                    pass
+                results[index] = result
+                waiting.release()
+
+        try:
+            # the parsers are shut down first, so that every parsed batch reaches the uploaders
+            with Manager() as manager, ThreadPoolExecutor(connections) as uploaders, \
+                    ProcessPoolExecutor(workers) as parsers:
+                for index, path in enumerate(paths):
+                    try:
+                        unchanged, state, refresh = self.isUnchanged(path)
+                        if self.incremental and unchanged and self.isMirrored(path, state):
+                            if refresh is not None:
+                                pool.update(refresh)
+                            results[index] = {"path": path, "success": True, "skipped": True,
+                                              "triples": 0, "parse_seconds": 0.0, "upload_seconds": 0.0}
+                            continue
+                    except Exception as e:
+                        print(f"Upload of {path} failed: {str(e)}")
+                        results[index] = {"path": path, "success": False, "skipped": False,
+                                          "triples": 0, "parse_seconds": 0.0, "upload_seconds": 0.0}
+                        continue
+
+                    waiting.acquire()
+                    batches = manager.Queue(BATCHES_IN_FLIGHT)
+                    # parsers and uploaders take the files in the same order, so the first
+                    # file not uploaded yet is always being parsed or parsed already
+                    parsed = parsers.submit(
+                        parse_collection_file, path, base_url, batches, self.batchSize, mirrored
+                    )
+                    uploaders.submit(upload, index, state, batches, parsed)
+        finally:
+            pool.close()
+
+        return results
+
 
 # Done by Thomas and Evgeniia
 
@@ -369,13 +2083,115 @@ class TriplestoreQueryProcessor(QueryProcessor):
         PREFIX owl: <http://www.w3.org/2002/07/owl#> 
     """
 
+    def __init__(self):
+        super().__init__()
+        self.cache = ResultCache()
+        self.streamFormat = "json"
+
+    def getCacheSize(self) -> int:
+        return self.cache.size
+
+    def setCacheSize(self, size: int) -> bool:
+        #the number of query results kept, 0 turns the cache off
+        if isinstance(size, int) and size >= 0:
+            self.cache.resize(size)
+            return True
+        else:
+            print("The cache size must be a non negative integer")
+            return False
+
+    def getCacheTtl(self) -> float:
+        return self.cache.ttl
+
+    def setCacheTtl(self, ttl: float) -> bool:
+        #the seconds a query result is kept, None keeps it until the next upload
+        if ttl is None or (isinstance(ttl, (int, float)) and ttl > 0):
+            self.cache.ttl = ttl
+            return True
+        else:
+            print("The cache TTL must be a positive number of seconds or None")
+            return False
+
+    def getCacheStats(self) -> dict:
+        return self.cache.stats()
+
+    def clearCache(self):
+        self.cache.clear()
+
+    def query(self, query: str) -> pd.DataFrame:
+        """
+        It runs the input SPARQL query on the endpoint (or the local triplestore) and returns its results in a 
+        data frame. The results are cached by endpoint and query, which is built from 
+        the method and its arguments, until the endpoint receives an update from 
+        this process or the TTL expires
+        """
+
+        store = triplestore(self.getDbPathOrUrl())
+        generation = endpoint_generation(store.endpoint)
+        key = (store.endpoint, query)
+
+        result = self.cache.get(key, generation)
+        if result is None:
+            result = store.query(query)
+            self.cache.put(key, generation, result)
+
+        # a copy, so that the callers cannot change the cached data frame
+        return result.copy()
+
+    def getStreamFormat(self) -> str:
+        return self.streamFormat
+
+    def setStreamFormat(self, format: str) -> bool:
+        #the format of the streamed results, "json" or "tsv"
+        if format in SPARQL_STREAM_FORMATS:
+            self.streamFormat = format
+            return True
+        else:
+            print("The stream format must be one of: " + ", ".join(SPARQL_STREAM_FORMATS))
+            return False
+
+    def streamRows(self, query: str):
+        """
+        It runs the input SPARQL query and yields its rows as tuples of strings 
+        while the response arrives, in the order of the variables of the query. 
+        The streamed results bypass the cache
+        """
+        rows = triplestore(self.getDbPathOrUrl()).stream(query, self.streamFormat)
+        try:
+            next(rows)  # the variables
+            yield from rows
+        finally:
+            rows.close()
+
+    def streamQuery(self, query: str, chunk_size: int = 10000):
+        """
+        It runs the input SPARQL query and yields its results as data frames of 
+        chunk_size rows while the response arrives, so that the memory used depends 
+        on chunk_size and not on the size of the result. The values are strings 
+        and the streamed results bypass the cache
+        """
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise ValueError("The chunk size must be a positive integer")
+        return row_chunks(triplestore(self.getDbPathOrUrl()).stream(query, self.streamFormat), chunk_size)
+
+    def streamAllCanvases(self, chunk_size: int = 10000):
+        """
+        It yields the canvases of getAllCanvases as data frames of chunk_size rows
+        """
+        return self.streamEntitiesWithType("canvas", chunk_size)
+
+    def streamEntitiesWithType(self, entity_type, chunk_size: int = 10000):
+        """
+        It yields the entities of getEntitiesWithType as data frames of chunk_size rows
+        """
+        return self.streamQuery(self.entitiesWithTypeQuery(entity_type), chunk_size)
+
     def getEntityById(self, entity_id):
         """
         It returns a data frame containing an entity 
         identified by the input identifier
         """
 
-        endpoint = self.getDbPathOrUrl()
         query = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
@@ -388,7 +2204,31 @@ class TriplestoreQueryProcessor(QueryProcessor):
                 
             }}
             """
-        df_sparql = get(endpoint, query, True)
+        df_sparql = self.query(query)
+        return df_sparql
+
+    def getEntitiesByIds(self, ids):
+        """
+        It returns a data frame containing the entities identified by any 
+        of the input identifiers, asked with a VALUES block in one single query
+        """
+
+        if len(ids) == 0:
+            return pd.DataFrame(columns=["id", "type", "label"])
+
+        values = values_block(ids)
+        query = f"""
+            {TriplestoreQueryProcessor.SPARQL_PREFIXES}
+            
+            SELECT ?id ?type ?label
+            WHERE {{
+                VALUES ?id {{ {values} }}
+                ?entity schema:identifier ?id .
+                ?entity rdf:type ?type .
+                ?entity rdfs:label ?label .
+            }}
+            """
+        df_sparql = self.query(query)
         return df_sparql
 
 
@@ -397,7 +2237,6 @@ class TriplestoreQueryProcessor(QueryProcessor):
         It returns a data frame containing all the canvases included in the database
         """
 
-        endpoint = self.getDbPathOrUrl()
         query_Canvas = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
 
@@ -409,7 +2248,7 @@ class TriplestoreQueryProcessor(QueryProcessor):
 
             }}
             """
-        df_sparql_getAllCanvases = get(endpoint, query_Canvas, True)
+        df_sparql_getAllCanvases = self.query(query_Canvas)
         return df_sparql_getAllCanvases
 
     def getAllCollections(self):
@@ -418,7 +2257,6 @@ class TriplestoreQueryProcessor(QueryProcessor):
         included in the database
         """
 
-        endpoint = self.getDbPathOrUrl()
         query_Collection = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
@@ -429,7 +2267,7 @@ class TriplestoreQueryProcessor(QueryProcessor):
                    rdfs:label ?label .
             }}
             """
-        df_sparql_getAllCollections = get(endpoint, query_Collection, True)
+        df_sparql_getAllCollections = self.query(query_Collection)
         return df_sparql_getAllCollections
 
 
@@ -439,7 +2277,6 @@ class TriplestoreQueryProcessor(QueryProcessor):
         included in the database
         """
 
-        endpoint = self.getDbPathOrUrl()
         query_Manifest = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
@@ -451,34 +2288,120 @@ class TriplestoreQueryProcessor(QueryProcessor):
         
             }}
             """
-        df_sparql_getAllManifests = get(endpoint, query_Manifest, True)
+        df_sparql_getAllManifests = self.query(query_Manifest)
         return df_sparql_getAllManifests
 
+    def getHierarchy(self, collection_ids=None, manifest_ids=None):
+        """
+        It returns a data frame with the whole collection-manifest-canvas tree:
+        one row for each canvas of each manifest of each collection, with the 
+        identifiers and labels of the three levels. The levels that are missing 
+        (e.g. a manifest outside any collection) are left empty.
+        The tree can be restricted to the input collections or manifests
+        """
+
+        collection_pattern = """
+                        ?collection rdf:type rumi:Collection ;
+                            schema:identifier ?collection_id ;
+                            rdfs:label ?collection_label ;
+                            rumi:items ?manifest ."""
+        if collection_ids is None:
+            collection_pattern = f"OPTIONAL {{ {collection_pattern} }}"
+            collection_values = ""
+        else:
+            collection_values = f"VALUES ?collection_id {{ {values_block(collection_ids)} }}"
+        manifest_values = ""
+        if manifest_ids is not None:
+            manifest_values = f"VALUES ?manifest_id {{ {values_block(manifest_ids)} }}"
+
+        # collections without manifests, only when the tree is not restricted to some manifests
+        empty_collections = ""
+        if manifest_ids is None:
+            empty_collections = f"""
+                UNION
+                {{
+                    {collection_values}
+                    ?collection rdf:type rumi:Collection ;
+                        schema:identifier ?collection_id ;
+                        rdfs:label ?collection_label .
+                    FILTER NOT EXISTS {{ ?collection rumi:items ?any }}
+                }}"""
+
+        query_Hierarchy = f"""
+            {TriplestoreQueryProcessor.SPARQL_PREFIXES}
+
+            SELECT ?collection_id ?collection_label ?manifest_id ?manifest_label ?canvas_id ?canvas_label
+            WHERE {{
+                {{
+                    {collection_values}
+                    {manifest_values}
+                    ?manifest rdf:type rumi:Manifest ;
+                        schema:identifier ?manifest_id ;
+                        rdfs:label ?manifest_label .
+                    {collection_pattern}
+                    OPTIONAL {{
+                        ?manifest rumi:items ?canvas .
+                        ?canvas rdf:type rumi:Canvas ;
+                            schema:identifier ?canvas_id ;
+                            rdfs:label ?canvas_label .
+                    }}
+                }}{empty_collections}
+            }}
+            """
+        df_sparql_Hierarchy = self.query(query_Hierarchy)
+        return df_sparql_Hierarchy
+
+
+    def hasPartOfLinks(self) -> bool:
+        """
+        It returns whether every file in the graph database was uploaded with the
+        partOf and partOfCollection triples (GRAPH_VERSION 2 of CollectionProcessor).
+        Otherwise the containment is only found through the items triples
+        """
+
+        query_PartOfLinks = f"""
+            {TriplestoreQueryProcessor.SPARQL_PREFIXES}
+
+            SELECT (COUNT(?upload) AS ?uploads) (COUNT(?version) AS ?linked)
+            WHERE {{
+                ?upload rumi:contentHash ?hash .
+                OPTIONAL {{
+                    ?upload rumi:graphVersion ?version .
+                    FILTER(?version >= 2)
+                }}
+            }}
+            """
+        row = self.query(query_PartOfLinks).iloc[0]
+        return int(row["uploads"]) > 0 and int(row["uploads"]) == int(row["linked"])
 
     def getCanvasesInCollection(self, collection_id):
         """
         It returns a data frame containing all the canvases included in the database
-        that are contained in the collection identified by the input identifier
+        that are contained in the collection identified by the input identifier,
+        found through their partOfCollection triples (or the items of its manifests
+        in the graphs uploaded before them)
         """
 
-        endpoint = self.getDbPathOrUrl()
+        if self.hasPartOfLinks():
+            containment = f"?Canvas rumi:partOfCollection <{collection_id}> ."
+        else:
+            containment = f"""<{collection_id}> rdf:type rumi:Collection ;
+                    rumi:items ?manifest .
+                ?manifest rdf:type rumi:Manifest ;
+                    rumi:items ?Canvas ."""
+
         query_CanvasInCollection = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
     
             SELECT ?id ?label
             WHERE {{
-                ?collection_id rdf:type rumi:Collection ;
-                    rumi:items ?manifest_id .
-                ?manifest_id rdf:type rumi:Manifest ;
-                    rumi:items ?Canvas .
+                {containment}
                 ?Canvas schema:identifier ?id ;
                         rdfs:label ?label .
-
-                FILTER(?collection_id = <{collection_id}> )     
             }}
             """
 
-        df_sparql_CanvasesInCollection = get(endpoint, query_CanvasInCollection, True)
+        df_sparql_CanvasesInCollection = self.query(query_CanvasInCollection)
         return df_sparql_CanvasesInCollection
 
 
@@ -488,7 +2411,6 @@ class TriplestoreQueryProcessor(QueryProcessor):
         that are contained in the manifest identified by the input identifier
         """
 
-        endpoint = self.getDbPathOrUrl()
         query_CanvasInManifest = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
         
@@ -502,7 +2424,7 @@ class TriplestoreQueryProcessor(QueryProcessor):
                 FILTER(?manifest_id = <{manifest_id}> )            
             }}
             """
-        df_sparql_CanvasesInManifest = get(endpoint, query_CanvasInManifest, True)
+        df_sparql_CanvasesInManifest = self.query(query_CanvasInManifest)
         return df_sparql_CanvasesInManifest
 
 
@@ -512,7 +2434,6 @@ class TriplestoreQueryProcessor(QueryProcessor):
         that have the input label
         """
 
-        endpoint = self.getDbPathOrUrl()
         query_EntitiesWLabel = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
@@ -525,7 +2446,7 @@ class TriplestoreQueryProcessor(QueryProcessor):
 
             }}
             """
-        df_sparql_getEntitiesWLabel = get(endpoint, query_EntitiesWLabel, True)
+        df_sparql_getEntitiesWLabel = self.query(query_EntitiesWLabel)
         return df_sparql_getEntitiesWLabel
 
 
@@ -535,7 +2456,6 @@ class TriplestoreQueryProcessor(QueryProcessor):
         that are contained in the collection identified by the input identifier
         """
 
-        endpoint = self.getDbPathOrUrl()
         query_ManifestsInCollection = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
@@ -549,8 +2469,8 @@ class TriplestoreQueryProcessor(QueryProcessor):
                 FILTER(?collection_id = <{collection_id}> )     
             }}                            
             """
-        df_sparql_ManifestsInCollection = get(
-            endpoint, query_ManifestsInCollection, True
+        df_sparql_ManifestsInCollection = self.query(
+            query_ManifestsInCollection
         )
         return df_sparql_ManifestsInCollection
     
@@ -558,28 +2478,37 @@ class TriplestoreQueryProcessor(QueryProcessor):
     def getCollectionsContainingCanvases(self, canvas_id):
         """
         It returns a dataframe containing all the collections that contains the 
-        canvas specified as an input
+        canvas specified as an input. A list of canvases can be given as well: 
+        they are all asked in one single query, which follows the partOfCollection
+        triples from each canvas to its collections (or the items of the collections
+        in the graphs uploaded before them)
         """
 
-        endpoint = self.getDbPathOrUrl()
+        canvas_ids = [canvas_id] if isinstance(canvas_id, str) else list(canvas_id)
+        if len(canvas_ids) == 0:
+            return pd.DataFrame(columns=["id", "label"])
+
+        if self.hasPartOfLinks():
+            containment = "?canvas rumi:partOfCollection ?collection ."
+        else:
+            containment = """?collection rdf:type rumi:Collection ;
+                            rumi:items ?manifest .
+                ?manifest rdf:type rumi:Manifest ;
+                          rumi:items ?canvas ."""
+
         query_getCollectionsContainingCanvases = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
-            SELECT ?id ?label
+            SELECT DISTINCT ?id ?label
             WHERE {{
-                ?collection rdf:type rumi:Collection ;
-                            schema:identifier ?id ;
-                            rdfs:label ?label ;
-                            rumi:items ?manifest .
-                ?manifest rdf:type rumi:Manifest ;
-                          rumi:items ?canvas_id .
-                ?canvas_id schema:identifier "{canvas_id}" .
-                           
-            
+                VALUES ?canvas {{ {iri_values_block(canvas_ids)} }}
+                {containment}
+                ?collection schema:identifier ?id ;
+                            rdfs:label ?label .
             }}                            
             """
-        df_sparql_getCollectionsContainingCanvases = get(
-            endpoint, query_getCollectionsContainingCanvases, True
+        df_sparql_getCollectionsContainingCanvases = self.query(
+            query_getCollectionsContainingCanvases
         )
         return df_sparql_getCollectionsContainingCanvases
     
@@ -587,38 +2516,42 @@ class TriplestoreQueryProcessor(QueryProcessor):
     def getManifestsContainingCanvases(self, canvas_id):
         """
         It returns a dataframe containing all the manifests that contains
-        the canvas specified as an input
+        the canvas specified as an input. A list of canvases can be given 
+        as well: they are all asked in one single query, which follows the
+        partOf triples from each canvas to its manifests (or the items of the
+        manifests in the graphs uploaded before them)
         """
 
-        endpoint = self.getDbPathOrUrl()
+        canvas_ids = [canvas_id] if isinstance(canvas_id, str) else list(canvas_id)
+        if len(canvas_ids) == 0:
+            return pd.DataFrame(columns=["id", "label"])
+
+        if self.hasPartOfLinks():
+            containment = "?canvas rumi:partOf ?manifest ."
+        else:
+            containment = "?manifest rumi:items ?canvas ."
+
         query_getManifestsContainingCanvases = f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
-            SELECT ?id ?label
+            SELECT DISTINCT ?id ?label
             WHERE {{
+                VALUES ?canvas {{ {iri_values_block(canvas_ids)} }}
+                {containment}
                 ?manifest rdf:type rumi:Manifest ;
-                            schema:identifier ?id ;
-                            rdfs:label ?label ;
-                            rumi:items ?canvas_id .
-                ?canvas_id schema:identifier "{canvas_id}" .
-                           
-            
+                          schema:identifier ?id ;
+                          rdfs:label ?label .
             }}                            
             """
-        df_sparql_getManifestsContainingCanvases = get(
-            endpoint, query_getManifestsContainingCanvases, True
+        df_sparql_getManifestsContainingCanvases = self.query(
+            query_getManifestsContainingCanvases
         )
         return df_sparql_getManifestsContainingCanvases
     
 
-    def getEntitiesWithType(self, entity_type):
-        """
-        It returns a list of objects having class the type 
-        identified by the input string
-        """
-
-        endpoint = self.getDbPathOrUrl()
-        query = f"""
+    def entitiesWithTypeQuery(self, entity_type) -> str:
+        #the query shared by getEntitiesWithType and streamEntitiesWithType
+        return f"""
             {TriplestoreQueryProcessor.SPARQL_PREFIXES}
             
             SELECT ?id ?label
@@ -629,19 +2562,363 @@ class TriplestoreQueryProcessor(QueryProcessor):
                 
             }}
             """
-        df_sparql = get(endpoint, query, True)
+
+    def getEntitiesWithType(self, entity_type):
+        """
+        It returns a list of objects having class the type 
+        identified by the input string
+        """
+
+        df_sparql = self.query(self.entitiesWithTypeQuery(entity_type))
         return df_sparql
 
 
+#==============MATERIALIZATION OF THE MODEL OBJECTS==============
+
+MODEL_TYPES = {
+    "https://github.com/mjavadf/rumi_group_project/Canvas": Canvas,
+    "https://github.com/mjavadf/rumi_group_project/Collection": Collection,
+    "https://github.com/mjavadf/rumi_group_project/Manifest": Manifest
+}
+
+
+def column_values(df: pd.DataFrame, column: str) -> list:
+    #the values of a column as a plain list, with None for the missing values (or column)
+    if column not in df.columns:
+        return [None] * len(df)
+    values = df[column]
+    return values.astype(object).where(values.notna(), None).tolist()
+
+
+def unique_rows(df: pd.DataFrame, columns, seen: set = None):
+    """
+    It yields the values of the input columns row by row, read from whole column
+    arrays instead of iterrows, skipping the rows whose first value (the id)
+    is already in seen. seen is updated, so it can be shared between data frames
+    """
+    seen = set() if seen is None else seen
+    for row in zip(*(column_values(df, column) for column in columns)):
+        if row[0] not in seen:
+            seen.add(row[0])
+            yield row
+
+
+class IdentityMap(object):
+    """
+    It keeps the objects of the model built by the query processors, so that the 
+    same class and id give back the same object as long as something still uses it:
+    only weak references are kept, so the entities no longer used are freed.
+    One map can be given to several GenericQueryProcessor to share it in a session
+    """
+
+    def __init__(self):
+        self.entities = WeakValueDictionary()
+        self.lock = Lock()
+
+    def get(self, model, entity_id, build, fields: dict = None):
+        """
+        It returns the object of the input model and id, built with build if there 
+        is none. The fields that the kept object lacks (e.g. the title and the creator 
+        of a canvas first built from its label only) are taken from the input fields
+        """
+        key = (model, entity_id)
+        with self.lock:
+            entity = self.entities.get(key)
+            if entity is None:
+                entity = build()
+                self.entities[key] = entity
+            elif fields:
+                fill_missing_fields(entity, fields)
+        return entity
+
+    def __len__(self):
+        return len(self.entities)
+
+    def clear(self):
+        with self.lock:
+            self.entities.clear()
+
+
+def is_missing(value) -> bool:
+    return value is None or (isinstance(value, (str, list, tuple)) and len(value) == 0)
+
+
+def fill_missing_fields(entity, fields: dict):
+    #set the input fields the entity lacks, leaving the ones it already has
+    for name, value in fields.items():
+        if is_missing(value):
+            continue
+        if name == "items":
+            # the items not loaded yet are a function, which must not be called here
+            current = getattr(entity, "_items")
+            if not callable(current) and len(current) == 0:
+                entity.items = value
+        elif name == "creator":
+            if len(entity.creators) == 0:
+                entity.creator = value
+        elif is_missing(getattr(entity, name)):
+            setattr(entity, name, value)
+
+
+def make_entity(identities: IdentityMap, model, entity_id, **fields):
+    """
+    It returns a new object of the input model with the input id and fields or, 
+    when an identity map is given, the object it already has for that model and id,
+    completed with the input fields it was lacking
+    """
+    if identities is None:
+        return model(id=entity_id, **fields)
+    return identities.get(model, entity_id, lambda: model(id=entity_id, **fields), fields)
+
+
+def make_annotation(identities: IdentityMap, entity_id, motivation, target, body) -> Annotation:
+    return make_entity(
+        identities,
+        Annotation,
+        entity_id,
+        motivation=motivation,
+        # many annotations share a target, whose id is interned as their motivation is
+        target=make_entity(identities, IdentifiableEntity, interned(target)),
+        body=make_entity(identities, Image, body),
+    )
+
+
+def build_annotations(df: pd.DataFrame, seen: set = None, identities: IdentityMap = None) -> list:
+    return [
+        make_annotation(identities, entity_id, motivation, target, body)
+        for entity_id, motivation, target, body in unique_rows(
+            df, ("id", "motivation", "target", "body"), seen
+        )
+    ]
+
+
+def build_images(df: pd.DataFrame, seen: set = None, identities: IdentityMap = None, column: str = "body") -> list:
+    return [
+        make_entity(identities, Image, entity_id)
+        for entity_id, in unique_rows(df, (column,), seen)
+    ]
+
+
+def build_canvases(df: pd.DataFrame, seen: set = None, identities: IdentityMap = None) -> list:
+    return [
+        make_entity(identities, Canvas, entity_id, label=label)
+        for entity_id, label in unique_rows(df, ("id", "label"), seen)
+    ]
+
+
+def build_identifiables(df: pd.DataFrame, seen: set = None, identities: IdentityMap = None) -> list:
+    return [
+        make_entity(identities, IdentifiableEntity, str(entity_id))
+        for entity_id, in unique_rows(df, ("id",), seen)
+    ]
+
+
+def build_entities(df: pd.DataFrame, seen: set = None, identities: IdentityMap = None, item_pages: dict = None) -> list:
+    """
+    It builds a Canvas, Manifest or Collection for the rows having one of their
+    types, an Annotation for the rows having a motivation, and skips the others.
+    item_pages gives, for Manifest and Collection, the ItemPages loading their items
+    """
+    item_pages = {} if item_pages is None else item_pages
+    entities = []
+    columns = ("id", "type", "label", "title", "creator", "motivation", "target", "body")
+    for entity_id, type, label, title, creator, motivation, target, body in unique_rows(df, columns, seen):
+        model = MODEL_TYPES.get(type)
+        if model is not None:
+            fields = {"label": label, "title": title, "creator": creator}
+            if model in item_pages:
+                fields["items"] = item_pages[model].loader(entity_id)
+            entities.append(make_entity(identities, model, entity_id, **fields))
+        elif motivation is not None:
+            entities.append(make_annotation(identities, entity_id, motivation, target, body))
+    return entities
+
+
+def metadata_by_id(metadata: pd.DataFrame) -> dict:
+    #the title and the creator of each id of a data frame of the relational database
+    if "title" not in metadata.columns:
+        return {}
+    metadata = metadata.drop_duplicates(subset="id")
+    return {
+        entity_id: (title, creator)
+        for entity_id, title, creator in zip(
+            column_values(metadata, "id"),
+            column_values(metadata, "title"),
+            column_values(metadata, "creator"),
+        )
+    }
+
+
+class ItemPages(object):
+    """
+    It loads the items of a list of collections or manifests a page at a time.
+    The first access to the items of any entity of a page fetches the items of 
+    all the entities of that page with one call of load_page, which takes the ids
+    of the page and returns a dictionary from each id to its items
+    """
+
+    def __init__(self, ids, load_page, page_size: int = 100):
+        self.ids = list(ids)
+        self.position = {entity_id: i for i, entity_id in enumerate(self.ids)}
+        self.load_page = load_page
+        self.page_size = page_size
+        self.pages = {}
+        self.lock = Lock()
+
+    def items(self, entity_id) -> list:
+        number = self.position[entity_id] // self.page_size
+        with self.lock:
+            if number not in self.pages:
+                start = number * self.page_size
+                self.pages[number] = self.load_page(self.ids[start:start + self.page_size])
+        return self.pages[number].get(entity_id, [])
+
+    def loader(self, entity_id):
+        #a function without arguments returning the items of the input entity
+        return lambda: self.items(entity_id)
+
+
 #==============QUERIES IN THE BOTH DATABASES==============
 
 class GenericQueryProcessor(QueryProcessor):
     query_processors = []
 
+    def __init__(self):
+        super().__init__()
+        # the collections and manifests whose items are fetched together
+        self.pageSize = 100
+        self.identities = None
+        # the calls to the query processors run at the same time on these threads
+        self.workers = 4
+        self.executor = None
+        self.executorLock = Lock()
+        # the most calls running at the same time on each query processor (None: no limit)
+        self.backendLimit = None
+        self.backendSlots = {}
+
+    def getPageSize(self) -> int:
+        return self.pageSize
+
+    def setPageSize(self, page_size: int) -> bool:
+        if isinstance(page_size, int) and page_size > 0:
+            self.pageSize = page_size
+            return True
+        else:
+            print("The page size must be a positive integer")
+            return False
+
+    def getWorkers(self) -> int:
+        return self.workers
+
+    def setWorkers(self, workers: int) -> bool:
+        #the number of query processors asked at the same time, 1 asks them one by one
+        if isinstance(workers, int) and workers > 0:
+            with self.executorLock:
+                self._stop_executor()
+                self.workers = workers
+            return True
+        else:
+            print("The number of workers must be a positive integer")
+            return False
+
+    def getExecutor(self) -> ThreadPoolExecutor:
+        with self.executorLock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="query-processor"
+                )
+            return self.executor
+
+    def _stop_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def shutdown(self) -> bool:
+        """
+        It stops the threads asking the query processors at the same time, which
+        are started again by the next call. The query processors are left open
+        """
+        with self.executorLock:
+            self._stop_executor()
+        return True
+
+    def getBackendLimit(self) -> int:
+        return self.backendLimit
+
+    def setBackendLimit(self, limit: int) -> bool:
+        #the most calls running at the same time on each query processor, None for no limit
+        if limit is None or (isinstance(limit, int) and limit > 0):
+            with self.executorLock:
+                self.backendLimit = limit
+                self.backendSlots = {}
+            return True
+        else:
+            print("The backend limit must be a positive integer or None")
+            return False
+
+    def ask(self, processor, method: str, *args):
+        """
+        It calls the input method of the input query processor, with the input 
+        arguments, waiting for a free slot when the calls already running on 
+        that processor reach the backend limit
+        """
+
+        if self.backendLimit is None:
+            return getattr(processor, method)(*args)
+
+        with self.executorLock:
+            slots = self.backendSlots.get(id(processor))
+            if slots is None:
+                slots = self.backendSlots[id(processor)] = BoundedSemaphore(self.backendLimit)
+        with slots:
+            return getattr(processor, method)(*args)
+
+    def fanOut(self, method: str, *args) -> list:
+        """
+        It calls the input method, with the input arguments, on all the query 
+        processors having it at the same time, and returns a list of pairs 
+        (result, error), one for each of them, in the order of query_processors.
+        So the results are merged in the same order whatever processor answers 
+        first, and the call lasts as long as the slowest processor
+        """
+
+        processors = [p for p in self.query_processors if hasattr(p, method)]
+
+        def call(processor):
+            try:
+                return self.ask(processor, method, *args), None
+            except Exception as e:
+                return None, e
+
+        if self.workers <= 1 or len(processors) <= 1:
+            return [call(processor) for processor in processors]
+        return list(self.getExecutor().map(call, processors))
+
+    def getIdentityMap(self) -> IdentityMap:
+        return self.identities
+
+    def setIdentityMap(self, identities) -> bool:
+        """
+        It sets whether the same entity is returned as the same object. True gives 
+        the processor its own IdentityMap, an IdentityMap is shared with the 
+        other processors using it, and False (or None) turns it off
+        """
+        if identities is True:
+            self.identities = IdentityMap()
+        elif identities is False or identities is None:
+            self.identities = None
+        elif isinstance(identities, IdentityMap):
+            self.identities = identities
+        else:
+            print("The identity map must be a boolean or an IdentityMap")
+            return False
+        return True
+
     def cleanQueryProcessors(self):
         """
         It clean the list query_processors from all the QueryProcessor objects
-        it includes
+        it includes, closing the connections they keep open
         """
 
         success = True
@@ -650,10 +2927,12 @@ class GenericQueryProcessor(QueryProcessor):
                 processor, (RelationalQueryProcessor, TriplestoreQueryProcessor)
             ):
                 try:
-                    processor.connection.close()
+                    if hasattr(processor, "close"):
+                        processor.close()
                 except Exception as e:
                     print("Operation is failed")
                     success = False
+        self.query_processors = []
         return success
 
 
@@ -677,90 +2956,76 @@ class GenericQueryProcessor(QueryProcessor):
         self.query_processors.extend(query_processors)
         return True
 
-    # by Evgeniia
-    def convert_triple(self, dataframe):
-        match_types = {
-            "https://github.com/mjavadf/rumi_group_project/Canvas": Canvas,
-            "https://github.com/mjavadf/rumi_group_project/Collection": Collection,
-            "https://github.com/mjavadf/rumi_group_project/Manifest": Manifest
-        }
-
-        def build_object(row):
-            """It converts the input row into an object having the class model."""
-            model = match_types.get(row["type"])
-
-            if model:
-                return model(
-                    id=row["id"],
-                    label=row.get("label"),
-                    title=row.get("title"),
-                    creator=row.get("creator"),
-                )
-            else:
-                return None
-
-        return [build_object(row) for _, row in dataframe.iterrows()] 
-
     def getEntityById(self, entity_id):
         """
         It returns an identifiable entity with the same id as in the input
         or it returns None
         """
-        entities_data = pd.DataFrame(columns=["id"])
-                
-        for processor in self.query_processors:
-            data = processor.getEntityById(entity_id)
+        entities = self.getEntitiesByIds([entity_id])
+        return entities[0] if entities else None
+
+    def getEntitiesByIds(self, ids):
+        """
+        It returns a list with the identifiable entities having any of the input
+        identifiers, in the input order and without repetitions. Each query
+        processor is asked once for all the identifiers and the answers are
+        joined in memory
+        """
+        ids = list(dict.fromkeys(str(entity_id) for entity_id in ids))
+        if not ids:
+            return []
+
+        frames = []
+        for data, error in self.fanOut("getEntitiesByIds", ids):
+            if error is not None:
+                raise error
             if data is not None and not data.empty:
-                entities_data = pd.merge(entities_data, data, on='id', how='outer')
-                entities_data = entities_data[~entities_data.duplicated(subset='id')]  
-                            
-        if entities_data.empty:
-            return None
-        
-        if "type" in entities_data.columns:
-           object = self.convert_triple(entities_data)
-           return object[0]
-        
-        elif "motivation" in entities_data.columns:
-            entity = entities_data.iloc[0].to_dict()
-            return Annotation(
-                id=entity.get("id"),
-                motivation=entity.get("motivation"),
-                body=Image(id=entity.get("body")),
-                target=IdentifiableEntity(id=entity.get("target")),
-            )
-        
-        else:
-            return None
+                frames.append(data)
+        if not frames:
+            return []
 
+        # one row per id, taking for each column the first value found by the processors
+        entities_data = pd.concat(frames, ignore_index=True).groupby("id", sort=False).first()
+        entities_data = entities_data.reindex(ids).reset_index()
 
-    def getAllAnnotations(self):
+        # the items of the collections and manifests are loaded on first access
+        types = column_values(entities_data, "type")
+        item_pages = {
+            model: self.getItemPages(model, [i for i, t in zip(ids, types) if t == uri])
+            for uri, model in MODEL_TYPES.items()
+            if model is not Canvas
+        }
+
+        return build_entities(entities_data, identities=self.identities, item_pages=item_pages)
+
+    def collect(self, method: str, build, *args) -> list:
         """
-        It returns a list of objects having class Annotation 
-        included in the databases accessible via the query processors
+        It calls the input method, with the input arguments, on every query processor
+        having it and turns the returned data frames into objects with build.
+        The same entity returned by several processors is built only once
         """
 
-        annotations = []
+        seen = set()
+        entities = []
 
-        for processor in self.query_processors:
+        for data, error in self.fanOut(method, *args):
+            if error is not None:
+                continue
             try:
-                annotations_data = processor.getAllAnnotations()
-                if not annotations_data.empty:
-                    annotations.extend(
-                        [
-                            Annotation(
-                                id=annotation["id"],
-                                body=Image(id=annotation["body"]),
-                                target=IdentifiableEntity(id=annotation["target"]),
-                                motivation=annotation["motivation"],
-                            )
-                            for _, annotation in annotations_data.iterrows()
-                        ]
-                    )
-            except AttributeError:
+                if data is not None and not data.empty:
+                    entities.extend(build(data, seen, self.identities))
+            except Exception as e:
                 continue
 
-        return annotations
+        return entities
+
+    def getAllAnnotations(self):
+        """
+        It returns a list of objects having class Annotation 
+        included in the databases accessible via the query processors
+        """
+
+        return self.collect("getAllAnnotations", build_annotations)
 
 
     def getAllCanvas(self):
@@ -769,42 +3034,17 @@ class GenericQueryProcessor(QueryProcessor):
         in the databases accessible via the query processors
         """
 
-        canvases = []
-
-        for processor in self.query_processors:
-            try:
-                canvases_data = processor.getAllCanvases()
-                if not canvases_data.empty:
-                    canvases.extend(
-                        [
-                            Canvas(id=canvas["id"], label=canvas["label"])
-                            for _, canvas in canvases_data.iterrows()
-                        ]
-                    )
-            except AttributeError:
-                continue
+        return self.collect("getAllCanvases", build_canvases)
 
-        return canvases
 
     def getAllImages(self):
         """
         It returns a list of objects having class Image included 
         in the databases accessible via the query processors
-        """
-
-        images = []
-
-        for processor in self.query_processors:
-            try:
-                images_data = processor.getAllImages()
-                if not images_data.empty:
-                    images.extend(
-                        [Image(id=image["body"]) for _, image in images_data.iterrows()]
-                    )
-            except AttributeError:
-                continue
+        """
+
+        return self.collect("getAllImages", build_images)
 
-        return images
     
     # Done by Javad
 
@@ -815,21 +3055,7 @@ class GenericQueryProcessor(QueryProcessor):
         that have, as annotation target, the canvas specified by the input identifier
         """
 
-        annotations = []
-
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithTarget(canvasId)
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
-
-        return annotations
+        return self.collect("getAnnotationsWithTarget", build_annotations, canvasId)
 
 
     def getAnnotationsToCollection(self, collectionId: str) -> list: 
@@ -839,21 +3065,7 @@ class GenericQueryProcessor(QueryProcessor):
         as annotation target, the collection specified by the input identifier
         """
 
-        annotations = []
-
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithTarget(collectionId)
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
-    
-        return annotations
+        return self.collect("getAnnotationsWithTarget", build_annotations, collectionId)
 
 
     def getAnnotationsToManifest(self, manifestId: str) -> list: 
@@ -863,45 +3075,60 @@ class GenericQueryProcessor(QueryProcessor):
         as annotation target, the manifest specified by the input identifier
         """
 
-        annotations = []
+        return self.collect("getAnnotationsWithTarget", build_annotations, manifestId)
 
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithTarget(manifestId)
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
 
-        return annotations
+    def getAnnotationsInCollection(self, collectionId: str) -> list: 
+        """
+        It returns a list of objects having class Annotation, 
+        included in the databases accessible via the query processors, that have, 
+        as annotation target, any canvas of the collection specified by the input identifier
+        """
 
+        return self.collectInContainer("getAnnotationsInCollection", "getCanvasesInCollection", collectionId)
 
-    def getAnnotationsWithBody(self, bodyId: str) -> list:
+
+    def getAnnotationsInManifest(self, manifestId: str) -> list: 
         """
         It returns a list of objects having class Annotation, 
         included in the databases accessible via the query processors, that have, 
-        as annotation body, the entity specified by the input identifier
+        as annotation target, any canvas of the manifest specified by the input identifier
         """
 
-        annotations = []
+        return self.collectInContainer("getAnnotationsInManifest", "getCanvasesInManifest", manifestId)
 
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithBody(bodyId)
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
 
-        return annotations
+    def collectInContainer(self, method: str, canvases: str, containerId: str) -> list:
+        """
+        It returns the annotations to the canvases of the input container, joined in 
+        the relational database by the input method. If a relational database has no
+        Containment table (it was loaded before it existed), the canvases are asked 
+        to the graph with the canvases method and their annotations one at a time
+        """
+
+        relational = [p for p in self.query_processors if isinstance(p, RelationalQueryProcessor)]
+        if all(processor.hasContainment() for processor in relational):
+            return self.collect(method, build_annotations, containerId)
+
+        canvas_ids = []
+        for data, error in self.fanOut(canvases, containerId):
+            if error is None and data is not None and not data.empty:
+                canvas_ids.extend(column_values(data, "id"))
+        return [
+            annotation
+            for canvas_id in dict.fromkeys(canvas_ids)
+            for annotation in self.getAnnotationsToCanvas(canvas_id)
+        ]
+
+
+    def getAnnotationsWithBody(self, bodyId: str) -> list:
+        """
+        It returns a list of objects having class Annotation, 
+        included in the databases accessible via the query processors, that have, 
+        as annotation body, the entity specified by the input identifier
+        """
+
+        return self.collect("getAnnotationsWithBody", build_annotations, bodyId)
 
 
     def getAnnotationsWithBodyAndTarget(self, bodyId: str, targetId: str) -> list:
@@ -912,23 +3139,10 @@ class GenericQueryProcessor(QueryProcessor):
         by the input identifiers
         """
 
-        annotations = []
-
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithBodyAndTarget(
-                    bodyId, targetId
-                )
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
+        return self.collect(
+            "getAnnotationsWithBodyAndTarget", build_annotations, bodyId, targetId
+        )
 
-        return annotations
 
     def getAnnotationsWithTarget(self, targetId: str) -> list:
         """
@@ -937,21 +3151,8 @@ class GenericQueryProcessor(QueryProcessor):
         as annotation target, the manifest specified by the input identifier
         """
 
-        annotations = []
-
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithTarget(targetId)
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
+        return self.collect("getAnnotationsWithTarget", build_annotations, targetId)
 
-        return annotations
 
 
     # by Evgeniia
@@ -962,23 +3163,7 @@ class GenericQueryProcessor(QueryProcessor):
         identified by the input identifier
         """
 
-        canvases = []
-
-        for processor in self.query_processors:
-            if hasattr(processor, "getCanvasesInCollection"):
-                try:
-                    canvases_data = processor.getCanvasesInCollection(collection_id)
-                    if not canvases_data.empty:
-                        canvases.extend(
-                            [
-                                Canvas(id=canvas["id"], label=canvas.get("label"))
-                                for _, canvas in canvases_data.iterrows()
-                            ]
-                        )
-                except AttributeError:
-                    continue
-
-        return canvases
+        return self.collect("getCanvasesInCollection", build_canvases, collection_id)
 
 
     def getCanvasesInManifest(self, manifest_id):
@@ -988,62 +3173,159 @@ class GenericQueryProcessor(QueryProcessor):
         identified by the input identifier
         """
 
-        canvases = []
+        return self.collect("getCanvasesInManifest", build_canvases, manifest_id)
+
+
+    def getHierarchy(self, collection_ids=None, manifest_ids=None):
+        """
+        It returns a pair with the list of all the collections and the list of 
+        all the manifests, with their items, assembled in memory from one query 
+        for the whole tree and one bulk query for the metadata. The tree can be
+        restricted to the input collections or manifests: in the second case the
+        collections hold only some of their manifests, so their items are not set
+        """
+
+        collections, manifests, items = self.assembleHierarchy(collection_ids, manifest_ids)
+        if manifest_ids is None:
+            for collection in collections:
+                fill_missing_fields(collection, {"items": items[collection.id]})
+        return collections, manifests
+
+    def assembleHierarchy(self, collection_ids=None, manifest_ids=None):
+        """
+        It returns the collections and the manifests of getHierarchy and a 
+        dictionary from the id of each of them to the items found in the tree.
+        The manifests, always whole in the tree, get the items they lack, while
+        the items of the collections are left untouched
+        """
+
+        triple_processor = None
+        relational_processor = None
 
         for processor in self.query_processors:
-            if hasattr(processor, "getCanvasesInManifest"):
-                try:
-                    canvases_data = processor.getCanvasesInManifest(manifest_id)
-                    if not canvases_data.empty:
-                        canvases.extend(
-                            [
-                                Canvas(
-                                    id=canvas["id"],
-                                    label=canvas.get("label"),
-                                )
-                                for _, canvas in canvases_data.iterrows()
-                            ]
-                        )
-                except AttributeError:
-                    continue
+            if isinstance(processor, TriplestoreQueryProcessor):
+                triple_processor = processor
+            elif isinstance(processor, RelationalQueryProcessor):
+                relational_processor = processor
 
-        return canvases
+        if triple_processor is None or relational_processor is None:
+            return [], [], {}
+
+        tree = self.ask(triple_processor, "getHierarchy", collection_ids, manifest_ids)
+        if tree.empty:
+            return [], [], {}
+        tree = tree.astype(object).where(tree.notna(), None)
+
+        # title and creator of all the collections and manifests at once
+        ids = pd.concat([tree["collection_id"], tree["manifest_id"]]).dropna().unique()
+        metadata = metadata_by_id(self.ask(relational_processor, "getEntitiesByIds", list(ids)))
+
+        collections = {}
+        manifests = {}
+        # the items by id, in order and without duplicates
+        canvases_in_manifest = {}
+        manifests_in_collection = {}
+
+        for collection_id, collection_label, manifest_id, manifest_label, canvas_id, canvas_label in zip(
+            tree["collection_id"], tree["collection_label"], tree["manifest_id"],
+            tree["manifest_label"], tree["canvas_id"], tree["canvas_label"],
+        ):
+            if manifest_id is not None and manifest_id not in manifests:
+                title, creator = metadata.get(manifest_id, (None, None))
+                manifests[manifest_id] = make_entity(
+                    self.identities, Manifest, manifest_id,
+                    label=manifest_label, title=title, creator=creator,
+                )
+                canvases_in_manifest[manifest_id] = {}
+            if collection_id is not None and collection_id not in collections:
+                title, creator = metadata.get(collection_id, (None, None))
+                collections[collection_id] = make_entity(
+                    self.identities, Collection, collection_id,
+                    label=collection_label, title=title, creator=creator,
+                )
+                manifests_in_collection[collection_id] = {}
 
-    
-    def getAllManifests(self):
+            if canvas_id is not None and canvas_id not in canvases_in_manifest[manifest_id]:
+                canvases_in_manifest[manifest_id][canvas_id] = make_entity(
+                    self.identities, Canvas, canvas_id, label=canvas_label
+                )
+            if collection_id is not None and manifest_id is not None:
+                manifests_in_collection[collection_id][manifest_id] = manifests[manifest_id]
+
+        items = {manifest_id: list(canvases.values()) for manifest_id, canvases in canvases_in_manifest.items()}
+        # a shared object keeps the items it has, or the loader that will fetch them
+        for manifest_id, manifest in manifests.items():
+            fill_missing_fields(manifest, {"items": items[manifest_id]})
+        for collection_id, manifests_in in manifests_in_collection.items():
+            items[collection_id] = list(manifests_in.values())
+        return list(collections.values()), list(manifests.values()), items
+
+    def getItemPages(self, model, ids) -> ItemPages:
+        #the pages loading the items of the input collections or manifests (the model)
+        # the items are taken from the tree, the entities may be the ones waiting for them
+        if model is Manifest:
+            def load_page(page_ids):
+                manifests, items = self.assembleHierarchy(manifest_ids=page_ids)[1:]
+                return {manifest.id: items[manifest.id] for manifest in manifests}
+        else:
+            def load_page(page_ids):
+                collections, _, items = self.assembleHierarchy(collection_ids=page_ids)
+                return {collection.id: items[collection.id] for collection in collections}
+
+        return ItemPages(ids, load_page, self.getPageSize())
+
+    def getLazyEntities(self, model, entities_data: pd.DataFrame) -> list:
         """
-        It returns a list of objects having class Manifest included 
-        in the databases accessible via the query processors
+        It returns a list of objects having the class of the input model (Collection 
+        or Manifest) for the rows of the input data frame, with their id and label, 
+        and with title and creator asked to the relational database all at once.
+        Their items are not fetched here: they are loaded a page at a time 
+        (see setPageSize) the first time the items of one of them are accessed
         """
 
-        manifests = []
+        triple_processor = None
         relational_processor = None
 
         for processor in self.query_processors:
-            try:
-                manifests_data = processor.getAllManifests()
-                if not manifests_data.empty:
-                    manifests.extend(
-                        [
-                            Manifest(
-                                id=manifest["id"],
-                                label=manifest.get("label"),
-                                title=relational_processor.getEntityById(
-                                    manifest["id"]
-                                ).loc[0, "title"],
-                                creator=relational_processor.getEntityById(
-                                    manifest["id"]
-                                ).loc[0, "creator"],
-                                items=self.getCanvasesInManifest(manifest["id"]),
-                            )
-                            for _, manifest in manifests_data.iterrows()
-                        ]
-                    )
-            except AttributeError:
+            if isinstance(processor, TriplestoreQueryProcessor):
+                triple_processor = processor
+            elif isinstance(processor, RelationalQueryProcessor):
                 relational_processor = processor
-                continue
 
-        return manifests
+        if triple_processor is None or relational_processor is None:
+            return []
+        if entities_data.empty:
+            return []
+
+        entities_data = entities_data.drop_duplicates(subset="id")
+        ids = column_values(entities_data, "id")
+        metadata = metadata_by_id(self.ask(relational_processor, "getEntitiesByIds", ids))
+
+        pages = self.getItemPages(model, ids)
+        entities = []
+        for entity_id, label in zip(ids, column_values(entities_data, "label")):
+            title, creator = metadata.get(entity_id, (None, None))
+            entities.append(
+                make_entity(
+                    self.identities, model, entity_id,
+                    label=label, title=title, creator=creator,
+                    items=pages.loader(entity_id),
+                )
+            )
+
+        return entities
+
+    def getAllManifests(self):
+        """
+        It returns a list of objects having class Manifest included 
+        in the databases accessible via the query processors
+        """
+
+        for processor in self.query_processors:
+            if isinstance(processor, TriplestoreQueryProcessor):
+                return self.getLazyEntities(Manifest, self.ask(processor, "getAllManifests"))
+
+        return []
 
     def getEntitiesWithCreator(self, creator_name):
         """
@@ -1051,8 +3333,6 @@ class GenericQueryProcessor(QueryProcessor):
         with the same creator as in the input 
         """
 
-        entities =[]
-        unique_ids = set()  # To keep track of unique IDs
         triple_processor = None
         relational_processor = None
 
@@ -1066,18 +3346,10 @@ class GenericQueryProcessor(QueryProcessor):
         if triple_processor is None or relational_processor is None:
             return []  # return an empty list if either processor is not found  
         
-        relational_entity = relational_processor.getEntitiesWithCreator(creator_name)
-
-        for _, entity in relational_entity.iterrows():
-            entity_id = entity["id"]
-            if entity_id not in unique_ids:
-                    unique_ids.add(entity_id)
+        relational_entity = self.ask(relational_processor, "getEntitiesWithCreator", creator_name)
 
-            entity_info = self.getEntityById(entity_id)
-            if entity_info is not None:  
-                entities.append(entity_info)   
-                
-        return entities       
+        # all the entities are resolved at once instead of one getEntityById per row
+        return self.getEntitiesByIds(relational_entity["id"])
 
 
     def getEntitiesWithLabel(self, label):
@@ -1087,8 +3359,6 @@ class GenericQueryProcessor(QueryProcessor):
         related to the entities having, as label, the input label
         """
 
-        entities = []
-        unique_ids = set()  # To keep track of unique IDs
         triple_processor = None
         relational_processor = None
 
@@ -1102,18 +3372,10 @@ class GenericQueryProcessor(QueryProcessor):
         if triple_processor is None or relational_processor is None:
             return []  # return an empty list if either processor is not found  
         
-        triple_entity = triple_processor.getEntitiesWithLabel(label)
+        triple_entity = self.ask(triple_processor, "getEntitiesWithLabel", label)
 
-        for _, entity in triple_entity.iterrows():
-            entity_id = entity["id"]
-            if entity_id not in unique_ids:
-                unique_ids.add(entity_id)
-
-            entity_info = self.getEntityById(entity_id)
-            if entity_info is not None:  
-                entities.append(entity_info)
-                
-        return entities   
+        # all the entities are resolved at once instead of one getEntityById per row
+        return self.getEntitiesByIds(triple_entity["id"])
             
 
     def getEntitiesWithTitle(self, title):
@@ -1123,8 +3385,6 @@ class GenericQueryProcessor(QueryProcessor):
         the entities having, as title, the input title
         """
 
-        entities = []
-        unique_ids = set()  # To keep track of unique IDs
         triple_processor = None
         relational_processor = None
 
@@ -1138,18 +3398,10 @@ class GenericQueryProcessor(QueryProcessor):
         if triple_processor is None or relational_processor is None:
             return []  # return an empty list if either processor is not found  
         
-        relational_entity = relational_processor.getEntitiesWithTitle(title)
-
-        for _, entity in relational_entity.iterrows():
-            entity_id = entity["id"]
-            if entity_id not in unique_ids:
-                unique_ids.add(entity_id)
+        relational_entity = self.ask(relational_processor, "getEntitiesWithTitle", title)
 
-            entity_info = self.getEntityById(entity_id)
-            if entity_info is not None:  
-                entities.append(entity_info)
-                
-        return entities        
+        # all the entities are resolved at once instead of one getEntityById per row
+        return self.getEntitiesByIds(relational_entity["id"])
 
 
     def getImagesAnnotatingCanvas(self, canvas_id):
@@ -1159,20 +3411,7 @@ class GenericQueryProcessor(QueryProcessor):
         targetting the canvases specified by the input identifier
         """
 
-        images = []
-
-        for processor in self.query_processors:
-            if hasattr(processor, "getAnnotationsWithTarget"):
-                annotations_data = processor.getAnnotationsWithTarget(canvas_id)
-                if not annotations_data.empty:
-                    images.extend(
-                        [
-                            Image(id=annotation["body"])
-                            for _, annotation in annotations_data.iterrows()
-                        ]
-                    )
-
-        return images
+        return self.collect("getAnnotationsWithTarget", build_images, canvas_id)
 
 
     def getManifestsInCollection(self, collection_id):
@@ -1182,45 +3421,9 @@ class GenericQueryProcessor(QueryProcessor):
         identified by the input identifier
         """
 
-        manifests = []
-
-        triple_processor = None
-        relational_processor = None
-
-        for processor in self.query_processors:
-            if isinstance(processor, TriplestoreQueryProcessor):
-                triple_processor = processor
-            elif isinstance(processor, RelationalQueryProcessor):
-                relational_processor = processor
-
-        if triple_processor is None or relational_processor is None:
-            return [] 
-
-        triple_manifest = triple_processor.getManifestsInCollection(collection_id)
-
-        for _, manifest in triple_manifest.iterrows():
-            manifest_id = manifest["id"]
-            label = manifest.get("label")
-            items = (self.getCanvasesInManifest(manifest["id"]),)
-            title = None
-            creator = None
-
-            entity_data = relational_processor.getEntityById(manifest_id)
-            if not entity_data.empty:
-                title = entity_data.loc[0, "title"]
-                creator = entity_data.loc[0, "creator"]
-
-            manifests.append(
-                Manifest(
-                    id=manifest_id,
-                    label=label,
-                    title=title,
-                    creator=creator,
-                    items=items,
-                )
-            )
+        collections, _, items = self.assembleHierarchy(collection_ids=[collection_id])
+        return items[collections[0].id] if collections else []
 
-        return manifests
 
     def getAllCollections(self):
         """
@@ -1228,46 +3431,11 @@ class GenericQueryProcessor(QueryProcessor):
         databases accessible via the query processors
         """
 
-        collections = []
-
-        triple_processor = None
-        relational_processor = None
-
         for processor in self.query_processors:
             if isinstance(processor, TriplestoreQueryProcessor):
-                triple_processor = processor
-            elif isinstance(processor, RelationalQueryProcessor):
-                relational_processor = processor
-
-        if triple_processor is None or relational_processor is None:
-            return []
-
-        triple_collections = triple_processor.getAllCollections()
-
-        for _, collection in triple_collections.iterrows():
-            collection_id = collection["id"]
-            label = collection.get("label")
-            title = None
-            creator = None
+                return self.getLazyEntities(Collection, self.ask(processor, "getAllCollections"))
 
-            entity_data = relational_processor.getEntityById(collection_id)
-            if not entity_data.empty:
-                title = entity_data.loc[0, "title"]
-                creator = entity_data.loc[0, "creator"]
-
-            items = self.getManifestsInCollection(collection_id)
-
-            collections.append(
-                Collection(
-                    id=collection_id,
-                    label=label,
-                    title=title,
-                    creator=creator,
-                    items=items,
-                )
-            )
-
-        return collections
+        return []
   
     def getCollectionsContainingCanvases(self, canvases): 
         """
@@ -1275,50 +3443,21 @@ class GenericQueryProcessor(QueryProcessor):
         databases accessible via the query processor, that contain 
         any of the canvases specified as input
         """
-        collections_unique = set()
-        collections = [] 
 
         triple_processor = None
-        relational_processor = None
 
         for processor in self.query_processors:
             if isinstance(processor, TriplestoreQueryProcessor):
                 triple_processor = processor
-            elif isinstance(processor, RelationalQueryProcessor):
-                relational_processor = processor
 
-        if triple_processor is None or relational_processor is None:
+        if triple_processor is None:
             return [] 
-        
-        for canvas_id in canvases:
-            triple_collection = triple_processor.getCollectionsContainingCanvases(canvas_id)
-
-            for _, collection in triple_collection.iterrows():
-                collection_id = collection["id"]
-                label = collection.get("label")
-                title = None
-                creator = None
-
-                entity_data = relational_processor.getEntityById(collection_id)
-                if not entity_data.empty:
-                    title = entity_data.loc[0, "title"]
-                    creator = entity_data.loc[0, "creator"]
-
-                items = self.getManifestsInCollection(collection_id)    
-      
-                if collection_id not in collections_unique:
-                    collections_unique.add(collection_id)
-                    collections.append(
-                        Collection(
-                            id=collection_id,
-                            label=label,
-                            title=title,
-                            creator=creator,
-                            items=items,
-                    )
-                )
 
-        return collections
+        # one query for all the canvases, then each collection is built only once
+        triple_collection = self.ask(
+            triple_processor, "getCollectionsContainingCanvases", list(canvases)
+        )
+        return self.getLazyEntities(Collection, triple_collection)
 
     def getManifestContainingCanvases(self, canvases):
         """
@@ -1327,50 +3466,20 @@ class GenericQueryProcessor(QueryProcessor):
         canvases specified as input
         """
 
-        manifests_unique = set()
-        manifests = [] 
-
         triple_processor = None
-        relational_processor = None
 
         for processor in self.query_processors:
             if isinstance(processor, TriplestoreQueryProcessor):
                 triple_processor = processor
-            elif isinstance(processor, RelationalQueryProcessor):
-                relational_processor = processor
 
-        if triple_processor is None or relational_processor is None:
+        if triple_processor is None:
             return [] 
-        
-        for canvas_id in canvases:
-            triple_manifest = triple_processor.getManifestsContainingCanvases(canvas_id)
-
-            for _, manifest in triple_manifest.iterrows():
-                manifest_id = manifest["id"]
-                label = manifest.get("label")
-                title = None
-                creator = None
-
-                entity_data = relational_processor.getEntityById(manifest_id)
-                if not entity_data.empty:
-                    title = entity_data.loc[0, "title"]
-                    creator = entity_data.loc[0, "creator"]
-
-                items = self.getCanvasesInManifest(manifest_id)    
-      
-                if manifest_id not in manifests_unique:
-                    manifests_unique.add(manifest_id)
-                    manifests.append(
-                        Manifest(
-                            id=manifest_id,
-                            label=label,
-                            title=title,
-                            creator=creator,
-                            items=items,
-                    )
-                )
 
-        return manifests
+        # one query for all the canvases, then each manifest is built only once
+        triple_manifest = self.ask(
+            triple_processor, "getManifestsContainingCanvases", list(canvases)
+        )
+        return self.getLazyEntities(Manifest, triple_manifest)
     
     def getEntityByType(self, entity_type):
         """
@@ -1384,22 +3493,19 @@ class GenericQueryProcessor(QueryProcessor):
         if entity_type not in allowed_types:
             raise ValueError("Invalid entity type")
 
+        seen = set()
         entities = []
-        entities_data = pd.DataFrame()
-        for processor in self.query_processors:
-            data = processor.getEntitiesWithType(entity_type)
+        for data, error in self.fanOut("getEntitiesWithType", entity_type):
+            if error is not None:
+                raise error
             if data is not None and not data.empty:
-                entities_data = pd.concat([entities_data, data], axis=0, ignore_index=True)
-                entities_data.drop_duplicates(subset=['id'], inplace=True)   
-
-        for _, entity_row in entities_data.iterrows():
-            entity_id = str(entity_row["id"])  
-            entities.append(IdentifiableEntity(id=entity_id))    
+                entities.extend(build_identifiables(data, seen, self.identities))
 
         if entities:
             return entities
         else:
              return None
+
     
     # by Evan & Javad
     
@@ -1409,20 +3515,9 @@ class GenericQueryProcessor(QueryProcessor):
         the databases accessible via the query processors, that have, as
         annotation target, the canvas specified by the input identifier.
         """
-        annotations = []
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithTarget(imageId)
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
 
-        return annotations
+        return self.collect("getAnnotationsWithTarget", build_annotations, imageId)
+
 
     def getAnnotationsToAnnotation(self, annotationId: str) -> list[Annotation]:
         """
@@ -1430,20 +3525,151 @@ class GenericQueryProcessor(QueryProcessor):
         databases accessible via the query processors, that have, as annotation 
         target, the canvas specified by the input identifier
         """
-        
-        annotations = []
-        for processor in self.query_processors:
-            try:
-                annotations_data = processor.getAnnotationsWithTarget(annotationId)
-                for idx, row in annotations_data.iterrows():
-                    annotations.append(
-                        Annotation(
-                            row["id"], row["body"], row["target"], row["motivation"]
-                        )
-                    )
-            except Exception as e:
-                continue
 
-        return annotations
+        return self.collect("getAnnotationsWithTarget", build_annotations, annotationId)
 
-    
+
+#==============ASYNCIO INTERFACE==============
+
+class AsyncGenericQueryProcessor(object):
+    """
+    The asyncio counterpart of GenericQueryProcessor, with the same query methods 
+    as coroutines. Each call runs the blocking SQLite and HTTP work of a wrapped 
+    GenericQueryProcessor on a pool of workers threads, so the event loop is never 
+    blocked and concurrent requests proceed together instead of one after the other.
+    Each call still asks the relational and the triplestore processors at the same 
+    time, and at most backend_limit calls run on each of them at once
+    """
+
+    def __init__(self, workers: int = 32, backend_limit: int = 8):
+        self.generic = GenericQueryProcessor()
+        self.generic.query_processors = []
+        self.generic.setWorkers(workers)
+        self.generic.setBackendLimit(backend_limit)
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="async-query"
+        )
+
+    def getQueryProcessor(self) -> GenericQueryProcessor:
+        """
+        It returns the wrapped GenericQueryProcessor, e.g. to set its page size,
+        identity map or backend limit
+        """
+        return self.generic
+
+    def cleanQueryProcessors(self):
+        return self.generic.cleanQueryProcessors()
+
+    def addQueryProcessor(self, query_processors):
+        return self.generic.addQueryProcessor(query_processors)
+
+    async def runInThread(self, function, *args):
+        #run the input blocking function on a worker thread
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def run(self, method: str, *args):
+        #run the input method of the wrapped GenericQueryProcessor on a worker thread
+        return await self.runInThread(getattr(self.generic, method), *args)
+
+    async def loadItems(self, entities: list) -> list:
+        """
+        It loads, on a worker thread, the items of the input collections and 
+        manifests, which are otherwise fetched on their first access: accessing 
+        them for the first time from a coroutine would block the event loop
+        """
+        def load():
+            for entity in entities:
+                if isinstance(entity, (Collection, Manifest)):
+                    entity.items
+            return entities
+        return await self.runInThread(load)
+
+    def close(self):
+        #stop the worker threads, the query processors are left open
+        self.executor.shutdown(wait=False)
+        self.generic.shutdown()
+
+    async def getEntityById(self, entity_id):
+        return await self.run("getEntityById", entity_id)
+
+    async def getEntitiesByIds(self, ids):
+        return await self.run("getEntitiesByIds", ids)
+
+    async def getAllAnnotations(self):
+        return await self.run("getAllAnnotations")
+
+    async def getAllCanvas(self):
+        return await self.run("getAllCanvas")
+
+    async def getAllImages(self):
+        return await self.run("getAllImages")
+
+    async def getAnnotationsToCanvas(self, canvasId):
+        return await self.run("getAnnotationsToCanvas", canvasId)
+
+    async def getAnnotationsToCollection(self, collectionId):
+        return await self.run("getAnnotationsToCollection", collectionId)
+
+    async def getAnnotationsToManifest(self, manifestId):
+        return await self.run("getAnnotationsToManifest", manifestId)
+
+    async def getAnnotationsInCollection(self, collectionId):
+        return await self.run("getAnnotationsInCollection", collectionId)
+
+    async def getAnnotationsInManifest(self, manifestId):
+        return await self.run("getAnnotationsInManifest", manifestId)
+
+    async def getAnnotationsWithBody(self, bodyId):
+        return await self.run("getAnnotationsWithBody", bodyId)
+
+    async def getAnnotationsWithBodyAndTarget(self, bodyId, targetId):
+        return await self.run("getAnnotationsWithBodyAndTarget", bodyId, targetId)
+
+    async def getAnnotationsWithTarget(self, targetId):
+        return await self.run("getAnnotationsWithTarget", targetId)
+
+    async def getCanvasesInCollection(self, collection_id):
+        return await self.run("getCanvasesInCollection", collection_id)
+
+    async def getCanvasesInManifest(self, manifest_id):
+        return await self.run("getCanvasesInManifest", manifest_id)
+
+    async def getHierarchy(self, collection_ids=None, manifest_ids=None):
+        return await self.run("getHierarchy", collection_ids, manifest_ids)
+
+    async def getAllManifests(self):
+        return await self.run("getAllManifests")
+
+    async def getEntitiesWithCreator(self, creator_name):
+        return await self.run("getEntitiesWithCreator", creator_name)
+
+    async def getEntitiesWithLabel(self, label):
+        return await self.run("getEntitiesWithLabel", label)
+
+    async def getEntitiesWithTitle(self, title):
+        return await self.run("getEntitiesWithTitle", title)
+
+    async def getImagesAnnotatingCanvas(self, canvas_id):
+        return await self.run("getImagesAnnotatingCanvas", canvas_id)
+
+    async def getManifestsInCollection(self, collection_id):
+        return await self.run("getManifestsInCollection", collection_id)
+
+    async def getAllCollections(self):
+        return await self.run("getAllCollections")
+
+    async def getCollectionsContainingCanvases(self, canvases):
+        return await self.run("getCollectionsContainingCanvases", canvases)
+
+    async def getManifestContainingCanvases(self, canvases):
+        return await self.run("getManifestContainingCanvases", canvases)
+
+    async def getEntityByType(self, entity_type):
+        return await self.run("getEntityByType", entity_type)
+
+    async def getAnnotationsToImage(self, imageId):
+        return await self.run("getAnnotationsToImage", imageId)
+
+    async def getAnnotationsToAnnotation(self, annotationId):
+        return await self.run("getAnnotationsToAnnotation", annotationId)
@@ -1,6 +1,33 @@
+from sys import intern
+
+
+def interned(value):
+    """
+    It returns the interned version of the input string, so that the many 
+    entities repeating the same motivation, target or creator share one string.
+    Identifiers are not interned, as most of them appear once. Values that
+    are not strings (e.g. None) are returned as they are.
+    """
+    return intern(value) if type(value) is str else value
+
+
+def creator_names(creator) -> tuple:
+    """
+    It returns the creators in the input "; " separated string as a tuple of 
+    interned names. A list or tuple of creators is accepted as well
+    """
+    if creator is None:
+        return ()
+    if isinstance(creator, str):
+        creator = creator.split(";")
+    return tuple(interned(name.strip()) for name in creator if name and name.strip())
+
+
 class IdentifiableEntity(object):
     """A base class that provides an identifier for an entity."""
 
+    __slots__ = ("id", "__weakref__")
+
     def __init__(self, id: str) -> None:
         """
         Initialize an instance of the class with an identifier.
@@ -22,6 +49,9 @@ class IdentifiableEntity(object):
 
 class Image(IdentifiableEntity):
     """A subclass of the IdentifiableEntity class that represents an image entity with a unique identifier."""
+
+    __slots__ = ()
+
     def __init__(self, id: str):
         super().__init__(id)
 
@@ -32,6 +62,8 @@ class Annotation(IdentifiableEntity):
     a motivation, a target, and a body.
     """
 
+    __slots__ = ("motivation", "target", "body")
+
     def __init__(self, id: str, motivation: str, target: IdentifiableEntity, body: Image):
         """
         Initialize an instance of the class with an identifier, a motivation, a target, and a body.
@@ -47,8 +79,8 @@ class Annotation(IdentifiableEntity):
         """
         super().__init__(id)
         self.body = body
-        self.target = target
-        self.motivation = motivation
+        self.target = interned(target)
+        self.motivation = interned(motivation)
 
 
     def getBody(self) -> Image:
@@ -80,32 +112,64 @@ class Annotation(IdentifiableEntity):
 
 
 class EntityWithMetadata(IdentifiableEntity):
-    def __init__(self, id, label, title=str, creator=str):
-        if creator is None:
-            creator = []
+    __slots__ = ("label", "title", "creators")
+
+    def __init__(self, id, label, title=None, creator=None):
         self.label = label
         self.title = title
         self.creator = creator
         super().__init__(id)
 
+    @property
+    def creator(self):
+        # the creators are kept split, the string is rebuilt only when asked
+        return "; ".join(self.creators) if self.creators else None
+
+    @creator.setter
+    def creator(self, creator):
+        self.creators = creator_names(creator)
+
     def getLabel(self) -> str:
         return self.label
 
     def getTitle(self) -> str:
-        if len (self.title) > 0:
+        if isinstance(self.title, str) and len(self.title) > 0:
             return self.title
         else:
             return None
 
-    def getCreator(self) -> str:
-        if len(self.creators) > 0:
-            return self.creators.split("; ")
-        else:
-            return list()
+    def getCreator(self) -> list:
+        return list(self.creators)
+
+
+class LazyItems(object):
+    """
+    A descriptor for the items of a Collection or a Manifest. The items can be given
+    as a list or as a function without arguments that returns them: in the second
+    case the function is called on the first access to the items, and its result is kept.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = "_" + name
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        items = getattr(entity, self.name)
+        if callable(items):
+            items = list(items())
+            setattr(entity, self.name, items)
+        return items
+
+    def __set__(self, entity, items):
+        setattr(entity, self.name, items)
 
 
 class Collection(EntityWithMetadata):
-    def __init__(self, id, label, items=None, title=str, creator=str):
+    __slots__ = ("_items",)
+    items = LazyItems()
+
+    def __init__(self, id, label, items=None, title=None, creator=None):
         super().__init__(id, label, title, creator)
         self.items = list() if items is None else items
 
@@ -114,7 +178,10 @@ class Collection(EntityWithMetadata):
 
 
 class Manifest(EntityWithMetadata):
-    def __init__(self, id, label, items=None, title=str, creator=str):
+    __slots__ = ("_items",)
+    items = LazyItems()
+
+    def __init__(self, id, label, items=None, title=None, creator=None):
         super().__init__(id, label, title, creator)
         self.items = list() if items is None else items
 
@@ -124,5 +191,7 @@ class Manifest(EntityWithMetadata):
 
 
 class Canvas(EntityWithMetadata):
-    def __init__(self, id, label, title=str, creator=str):
+    __slots__ = ()
+
+    def __init__(self, id, label, title=None, creator=None):
         super().__init__(id, label, title, creator)
@@ -13,46 +13,156 @@
 # ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR PERFORMANCE OF THIS
 # SOFTWARE.
 import unittest
+import asyncio
 from os import sep
+from tempfile import TemporaryDirectory
+from json import load
+from threading import Thread, Lock
+from urllib.parse import parse_qs
+from rdflib import Graph, URIRef
+from io import StringIO
+from sqlite3 import connect
+from gzip import compress as gzip
+from zlib import compress as deflate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from impl import AnnotationProcessor, MetadataProcessor, RelationalQueryProcessor
-from impl import CollectionProcessor, TriplestoreQueryProcessor
-from impl import GenericQueryProcessor
+from impl import CollectionProcessor, TriplestoreQueryProcessor, JsonStream, create_graph, iter_entity_triples
+from impl import GenericQueryProcessor, AsyncGenericQueryProcessor, IdentityMap
+from impl import iter_json_rows, iter_tsv_rows, SparqlConnectionPool, endpoint_generation
 from pandas import DataFrame
 from models.main_models import IdentifiableEntity, Canvas, Collection, Image, Annotation, Manifest, EntityWithMetadata
 
 
-# REMEMBER: before launching the tests, please run the Blazegraph instance!
+# REMEMBER: before launching the tests with a Blazegraph URL as graph, please run the Blazegraph instance!
+
+class SparqlHandler(BaseHTTPRequestHandler):
+    # a SPARQL endpoint answering any query with the same results
+    protocol_version = "HTTP/1.1"
+    encoding = ""
+    requests = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        SparqlHandler.requests.append(body)
+        if self.headers["Content-Type"] == "application/x-www-form-urlencoded":
+            data = b""
+        elif self.headers["Accept"] == "application/sparql-results+json":
+            data = b'{"head": {"vars": ["id"]}, "results": {"bindings": [{"id": {"type": "uri", "value": "a"}}]}}'
+        else:
+            data = b"id,label\na,A\nb,B\n"
+        if self.encoding == "gzip":
+            data = gzip(data)
+        elif self.encoding == "deflate":
+            data = deflate(data)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        if self.encoding:
+            self.send_header("Content-Encoding", self.encoding)
+        self.end_headers()
+        self.wfile.write(data)
+        # the connection is dropped without telling the client, as an idle timeout does
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class GraphSparqlHandler(BaseHTTPRequestHandler):
+    # a SPARQL endpoint running the queries and the updates on an in-memory graph
+    protocol_version = "HTTP/1.1"
+    graph = Graph()
+    lock = Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        with self.lock:
+            if self.headers["Content-Type"] == "application/x-www-form-urlencoded":
+                self.graph.update(parse_qs(body)["update"][0])
+                data = b""
+            else:
+                data = self.graph.query(body).serialize(format="csv")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
 
 class TestProjectBasic(unittest.TestCase):
 
     # The paths of the files used in the test should change depending on what you want to use
     # and the folder where they are. Instead, for the graph database, the URL to talk with
-    # the SPARQL endpoint must be updated depending on how you launch it - currently, it is
-    # specified the URL introduced during the course, which is the one used for a standard
-    # launch of the database.
+    # the SPARQL endpoint must be updated depending on how you launch it - e.g. the URL
+    # introduced during the course, which is the one used for a standard launch of the
+    # database. Currently, it is specified the path of a local file: the graph database
+    # is stored in the file and queried without any server.
     annotations = "data" + sep + "annotations.csv"
     collection = "data" + sep + "collection-1.json"
     metadata = "data" + sep + "metadata.csv"
     relational = "." + sep + "relational.db"
-    graph = "http://127.0.0.1:9999/blazegraph/sparql"
+    graph = "." + sep + "graph.db"
     
     def test_01_AnnotationProcessor(self):
         ann_dp = AnnotationProcessor()
         self.assertTrue(ann_dp.setDbPathOrUrl(self.relational))
         self.assertEqual(ann_dp.getDbPathOrUrl(), self.relational)
+        self.assertTrue(ann_dp.setChunkSize(100))
+        self.assertFalse(ann_dp.setChunkSize(0))
+        self.assertTrue(ann_dp.setIncremental(False))
+        self.assertTrue(ann_dp.uploadData(self.annotations))
+        self.assertEqual(ann_dp.getUploadStats()["rows"], 271)
+        # an unchanged file is not loaded again
+        self.assertTrue(ann_dp.setIncremental(True))
         self.assertTrue(ann_dp.uploadData(self.annotations))
+        self.assertTrue(ann_dp.getUploadStats()["skipped"])
 
     def test_02_MetadataProcessor(self):
         met_dp = MetadataProcessor()
         self.assertTrue(met_dp.setDbPathOrUrl(self.relational))
         self.assertEqual(met_dp.getDbPathOrUrl(), self.relational)
         self.assertTrue(met_dp.uploadData(self.metadata))
+        # uploading the same file again must not duplicate the rows
+        self.assertTrue(met_dp.uploadData(self.metadata))
+        # an entity whose creator is emptied loses its old creators
+        with TemporaryDirectory() as folder:
+            rel_qp = RelationalQueryProcessor()
+            self.assertTrue(rel_qp.setDbPathOrUrl(folder + sep + "relational.db"))
+            self.assertTrue(met_dp.setDbPathOrUrl(rel_qp.getDbPathOrUrl()))
+            for creator in ("Doe, Jane", ""):
+                with open(folder + sep + "metadata.csv", "w", encoding="utf-8") as f:
+                    f.write(f'id,title,creator\nhttps://example.org/manifest,Test,"{creator}"\n')
+                self.assertTrue(met_dp.uploadData(folder + sep + "metadata.csv"))
+            self.assertEqual(len(rel_qp.getEntitiesWithCreator("Doe, Jane")), 0)
+            self.assertTrue(rel_qp.close())
 
     def test_03_CollectionProcessor(self):
         col_dp = CollectionProcessor()
         self.assertTrue(col_dp.setDbPathOrUrl(self.graph))
         self.assertEqual(col_dp.getDbPathOrUrl(), self.graph)
+        self.assertTrue(col_dp.setBatchSize(500))
+        self.assertTrue(col_dp.setRelationalDbPath(self.relational))
+        self.assertFalse(col_dp.setBatchSize(-1))
+        self.assertTrue(col_dp.setIncremental(False))
         self.assertTrue(col_dp.uploadData(self.collection))
+        self.assertGreater(col_dp.getUploadStats()["triples"], 0)
+        self.assertTrue(col_dp.setIncremental(True))
+        uploaded = col_dp.uploadMany([self.collection], workers=1)
+        self.assertEqual(len(uploaded), 1)
+        self.assertTrue(uploaded[0]["success"])
+        # the JSON files are read the same whatever the chunks they are split into
+        for path in (self.collection, "data" + sep + "collection-2.json"):
+            with open(path, encoding="utf-8") as f:
+                expected = load(f)
+            graph = set(create_graph(path, CollectionProcessor.BASE_URL))
+            for chunk_size in (1, 7):
+                with open(path, encoding="utf-8") as f:
+                    self.assertEqual(JsonStream(f, chunk_size).value(), expected)
+                with open(path, encoding="utf-8") as f:
+                    triples = set(iter_entity_triples(JsonStream(f, chunk_size), CollectionProcessor.BASE_URL))
+                self.assertEqual(triples, graph)
+        self.assertEqual(len(create_graph(self.collection, CollectionProcessor.BASE_URL)), 1442)
 
     def test_04_RelationalQueryProcessor(self):
         rel_qp = RelationalQueryProcessor()
@@ -64,9 +174,38 @@ class TestProjectBasic(unittest.TestCase):
         self.assertIsInstance(rel_qp.getAnnotationsWithBodyAndTarget("just_a_test", "another_test"), DataFrame)
         self.assertIsInstance(rel_qp.getAnnotationsWithTarget("just_a_test"), DataFrame)
         self.assertIsInstance(rel_qp.getEntityById("just_a_test"), DataFrame)
+        self.assertIsInstance(rel_qp.getEntitiesByIds(["just_a_test", "another_test"]), DataFrame)
+        self.assertEqual(len(rel_qp.getEntityById("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")), 1)
         self.assertIsInstance(rel_qp.getEntitiesWithCreator("just_a_test"), DataFrame)
+        # "Doe, Jane" is the second of the creators of the collection
+        self.assertIn(
+            "https://dl.ficlit.unibo.it/iiif/28429/collection",
+            list(rel_qp.getEntitiesWithCreator("Doe, Jane")["id"]),
+        )
         self.assertIsInstance(rel_qp.getEntitiesWithTitle("just_a_test"), DataFrame)
 
+        self.assertTrue(rel_qp.setReadOptimized(True))
+        self.assertTrue(rel_qp.isReadOptimized())
+        self.assertIsInstance(rel_qp.getAnnotationsWithTarget("just_a_test"), DataFrame)
+        self.assertIsInstance(rel_qp.getAnnotationsWithTarget("just_a_test"), DataFrame)
+        self.assertGreaterEqual(rel_qp.getCacheStats()["hits"], 1)
+        # keyword arguments are accepted and share the cached result of the positional call
+        hits = rel_qp.getCacheStats()["hits"]
+        self.assertIsInstance(rel_qp.getAnnotationsWithTarget(target="just_a_test"), DataFrame)
+        self.assertEqual(rel_qp.getCacheStats()["hits"], hits + 1)
+        self.assertIsInstance(rel_qp.getEntityById(id="just_a_test"), DataFrame)
+        self.assertIsInstance(rel_qp.getEntitiesWithCreator(creator="just_a_test"), DataFrame)
+        # the connections of the threads that have finished are closed, and new
+        # threads still find the cached results
+        hits = rel_qp.getCacheStats()["hits"]
+        for _ in range(20):
+            thread = Thread(target=rel_qp.getAnnotationsWithTarget, args=("just_a_test",))
+            thread.start()
+            thread.join()
+        self.assertLessEqual(len(rel_qp.connections.opened), 2)
+        self.assertEqual(rel_qp.getCacheStats()["hits"], hits + 20)
+        self.assertTrue(rel_qp.close())
+
     def test_05_TriplestoreQueryProcessor(self):
         grp_qp = TriplestoreQueryProcessor()
         self.assertTrue(grp_qp.setDbPathOrUrl(self.graph))
@@ -77,8 +216,23 @@ class TestProjectBasic(unittest.TestCase):
         self.assertIsInstance(grp_qp.getCanvasesInCollection("just_a_test"), DataFrame)
         self.assertIsInstance(grp_qp.getCanvasesInManifest("just_a_test"), DataFrame)
         self.assertIsInstance(grp_qp.getEntityById("just_a_test"), DataFrame)
+        self.assertIsInstance(grp_qp.getEntitiesByIds(["just_a_test", "another_test"]), DataFrame)
         self.assertIsInstance(grp_qp.getEntitiesWithLabel("just_a_test"), DataFrame)
         self.assertIsInstance(grp_qp.getManifestsInCollection("just_a_test"), DataFrame)
+        self.assertIsInstance(grp_qp.getCollectionsContainingCanvases(["just_a_test", "another_test"]), DataFrame)
+        self.assertIsInstance(grp_qp.getManifestsContainingCanvases(["just_a_test", "another_test"]), DataFrame)
+        canvas = "https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1"
+        self.assertEqual(list(grp_qp.getCollectionsContainingCanvases(canvas)["id"]), ["https://dl.ficlit.unibo.it/iiif/28429/collection"])
+        self.assertEqual(list(grp_qp.getManifestsContainingCanvases(canvas)["id"]), ["https://dl.ficlit.unibo.it/iiif/2/28429/manifest"])
+        self.assertIsInstance(grp_qp.getAllCanvases(), DataFrame)
+        self.assertGreaterEqual(grp_qp.getCacheStats()["hits"], 1)
+        self.assertTrue(grp_qp.setCacheSize(0))
+        self.assertFalse(grp_qp.setStreamFormat("xml"))
+        for stream_format in ("json", "tsv"):
+            self.assertTrue(grp_qp.setStreamFormat(stream_format))
+            chunks = list(grp_qp.streamAllCanvases(10))
+            self.assertTrue(all(len(chunk) <= 10 for chunk in chunks))
+            self.assertEqual(sum(len(chunk) for chunk in chunks), len(grp_qp.getAllCanvases()))
 
     def test_06_GenericQueryProcessor(self):
          rel_qp = RelationalQueryProcessor()
@@ -103,11 +257,44 @@ class TestProjectBasic(unittest.TestCase):
          for a in can_1:
              self.assertIsInstance(a, Canvas)
 
+         self.assertFalse(generic.setPageSize(0))
+         self.assertTrue(generic.setPageSize(2))
+         self.assertTrue(generic.setIdentityMap(True))
+         self.assertIs(generic.getAllCanvas()[0], generic.getAllCanvas()[0])
+         # a manifest first seen without its metadata gets it when fully loaded
+         identities = IdentityMap()
+         manifest_id = "https://dl.ficlit.unibo.it/iiif/2/28429/manifest"
+         partial = identities.get(Manifest, manifest_id, lambda: Manifest(manifest_id, "Il Canzoniere"))
+         self.assertIsNone(partial.getTitle())
+         self.assertTrue(generic.setIdentityMap(identities))
+         full = generic.getEntityById(manifest_id)
+         self.assertIs(full, partial)
+         self.assertEqual(full.getTitle(), "Il Canzoniere")
+         self.assertEqual(full.getCreator(), ["Alighieri, Dante"])
+         # walking the items of a manifest leaves the collections holding it whole
+         col_dp = CollectionProcessor()
+         self.assertTrue(col_dp.setDbPathOrUrl(self.graph))
+         self.assertTrue(col_dp.uploadData("data" + sep + "collection-2.json"))
+         self.assertTrue(generic.setIdentityMap(True))
+         self.assertTrue(generic.setPageSize(100))
+         collection_id = "https://dl.ficlit.unibo.it/iiif/19428-19425/collection"
+         collection = [c for c in generic.getAllCollections() if c.id == collection_id][0]
+         canvas_id = "https://dl.ficlit.unibo.it/iiif/2/19428/canvas/p1"
+         for manifest in generic.getManifestContainingCanvases([canvas_id]):
+             self.assertGreater(len(manifest.items), 0)
+         self.assertGreater(len(generic.getEntityById("https://dl.ficlit.unibo.it/iiif/2/19425/manifest").items), 0)
+         self.assertEqual(len(collection.items), 2)
+         self.assertEqual(len(generic.getManifestsInCollection(collection_id)), 2)
+         self.assertTrue(generic.setIdentityMap(False))
+         self.assertFalse(generic.setWorkers(0))
+         self.assertTrue(generic.setWorkers(2))
          self.assertIsInstance(generic.getAllCollections(), list)
          col_1 = generic.getAllCollections()
          self.assertIsInstance(col_1, list)
          for a in col_1:
              self.assertIsInstance(a, Collection)
+             for m in a.getItems():
+                 self.assertIsInstance(m, Manifest)
 
          self.assertIsInstance(generic.getAllImages(), list)
          ima_1 = generic.getAllImages()
@@ -120,6 +307,8 @@ class TestProjectBasic(unittest.TestCase):
          self.assertIsInstance(man_1, list)
          for a in man_1:
              self.assertIsInstance(a, Manifest)
+             for c in a.getItems():
+                 self.assertIsInstance(c, Canvas)
         
          self.assertIsInstance(generic.getAnnotationsToCanvas("just_a_test"), list)
          ann_2 = generic.getAnnotationsToCanvas("https://dl.ficlit.unibo.it/iiif/2/28429/canvas/p1")
@@ -139,6 +328,12 @@ class TestProjectBasic(unittest.TestCase):
          for a in ann_4:
              self.assertIsInstance(a, Annotation)
 
+         self.assertEqual(generic.getAnnotationsInCollection("just_a_test"), [])
+         ann_in = generic.getAnnotationsInManifest("https://dl.ficlit.unibo.it/iiif/2/28429/manifest")
+         self.assertGreater(len(ann_in), 0)
+         for a in ann_in:
+             self.assertIsInstance(a, Annotation)
+
          self.assertIsInstance(generic.getAnnotationsWithBody("just_a_test"), list)
          ann_5 = generic.getAnnotationsWithBody("https://dl.ficlit.unibo.it/iiif/2/45499/full/699,800/0/default.jpg")
          self.assertIsInstance(ann_5, list)
@@ -200,4 +395,144 @@ class TestProjectBasic(unittest.TestCase):
          man_2 = generic.getManifestsInCollection("https://dl.ficlit.unibo.it/iiif/28429/collection")
          self.assertIsInstance(man_2, list)
          for a in man_2:
-             self.assertIsInstance(a, Manifest)
\ No newline at end of file
+             self.assertIsInstance(a, Manifest)
+
+         async_qp = AsyncGenericQueryProcessor()
+         self.assertTrue(async_qp.addQueryProcessor([rel_qp, grp_qp]))
+         self.assertIsInstance(asyncio.run(async_qp.getAllCanvas()), list)
+         async_qp.close()
+         self.assertIsNone(async_qp.getQueryProcessor().executor)
+         self.assertTrue(generic.shutdown())
+
+    def test_07_SparqlResults(self):
+        # the results come before the head, ?label is unbound in the second binding
+        json = (
+            '{"results": {"bindings": ['
+            '{"id": {"type": "uri", "value": "https://example.org/a"}, '
+            '"label": {"type": "literal", "value": "tab\\there \\"quoted\\" \\u00e8", "xml:lang": "it"}}, '
+            '{"id": {"type": "uri", "value": "https://example.org/b"}, '
+            '"count": {"type": "literal", "value": "3", "datatype": "http://www.w3.org/2001/XMLSchema#integer"}}'
+            ']}, "head": {"vars": ["id", "label", "count"]}}'
+        )
+        tsv = (
+            "?id\t?label\t?count\n"
+            '<https://example.org/a>\t"tab\\there \\"quoted\\" \\u00e8"@it\t\n'
+            '<https://example.org/b>\t\t"3"^^<http://www.w3.org/2001/XMLSchema#integer>\n'
+            "<https://example.org/c>\t\t4\n"
+        )
+        expected = [
+            ("id", "label", "count"),
+            ("https://example.org/a", 'tab\there "quoted" \u00e8', None),
+            ("https://example.org/b", None, "3"),
+        ]
+        # and the usual order, where the bindings are streamed
+        head_first = '{"head": {"vars": ["id", "label", "count"]}, ' + json[1:json.rfind(', "head"')] + "}"
+        for document in (json, head_first):
+            for chunk_size in (1, 65536):
+                self.assertEqual(list(iter_json_rows(JsonStream(StringIO(document), chunk_size))), expected)
+        self.assertEqual(list(iter_tsv_rows(StringIO(tsv))), expected + [("https://example.org/c", None, "4")])
+
+    def test_08_SparqlConnectionPool(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SparqlHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            endpoint = f"http://127.0.0.1:{server.server_port}/sparql"
+            pool = SparqlConnectionPool(endpoint, 2)
+            # each query after the first finds its keep-alive connection dropped and retries
+            for encoding in ("gzip", "deflate", ""):
+                SparqlHandler.encoding = encoding
+                data = pool.query("SELECT ?id ?label WHERE { ?id rdfs:label ?label }")
+                self.assertEqual(list(data["id"]), ["a", "b"])
+                self.assertEqual(list(data["label"]), ["A", "B"])
+            self.assertEqual(len(SparqlHandler.requests), 3)
+            self.assertEqual(list(pool.stream("SELECT ?id WHERE { ?id ?p ?o }")), [("id",), ("a",)])
+            generation = endpoint_generation(endpoint)
+            pool.update("INSERT DATA { <a> <b> <c> }")
+            self.assertEqual(endpoint_generation(endpoint), generation + 1)
+            self.assertTrue(SparqlHandler.requests[-1].startswith(b"update=INSERT"))
+            pool.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_09_CollectionProcessorEndpoint(self):
+        # the files are parsed by worker processes and sent by uploader threads
+        server = ThreadingHTTPServer(("127.0.0.1", 0), GraphSparqlHandler)
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            with TemporaryDirectory() as folder:
+                col_dp = CollectionProcessor()
+                self.assertTrue(col_dp.setDbPathOrUrl(f"http://127.0.0.1:{server.server_port}/sparql"))
+                self.assertTrue(col_dp.setRelationalDbPath(folder + sep + "relational.db"))
+                self.assertTrue(col_dp.setBatchSize(50))
+                paths = [self.collection, "data" + sep + "collection-2.json", "data" + sep + "missing.json"]
+                uploaded = col_dp.uploadMany(paths, workers=2, connections=2)
+                self.assertEqual([result["success"] for result in uploaded], [True, True, False])
+                self.assertEqual([result["triples"] for result in uploaded], [1442, 205, 0])
+                graph = create_graph(paths[1], CollectionProcessor.BASE_URL, create_graph(paths[0], CollectionProcessor.BASE_URL))
+                self.assertTrue(all(triple in GraphSparqlHandler.graph for triple in graph))
+                trp_qp = TriplestoreQueryProcessor()
+                self.assertTrue(trp_qp.setDbPathOrUrl(col_dp.getDbPathOrUrl()))
+                self.assertTrue(trp_qp.hasPartOfLinks())
+                rel_qp = RelationalQueryProcessor()
+                self.assertTrue(rel_qp.setDbPathOrUrl(folder + sep + "relational.db"))
+                self.assertTrue(rel_qp.hasContainment())
+                self.assertTrue(rel_qp.close())
+                with connect(folder + sep + "relational.db") as con:
+                    self.assertEqual(con.execute("SELECT COUNT(*) FROM Containment").fetchone()[0], 542)
+                con.close()
+                # unchanged files are skipped
+                uploaded = col_dp.uploadMany(paths[:2], workers=2)
+                self.assertEqual([result["skipped"] for result in uploaded], [True, True])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_10_TriplestoreOldGraph(self):
+        # a graph uploaded before the partOf triples is still walked through its items
+        graph = create_graph("data" + sep + "collection-2.json", CollectionProcessor.BASE_URL)
+        old = Graph()
+        links = {URIRef(CollectionProcessor.BASE_URL + "partOf"), URIRef(CollectionProcessor.BASE_URL + "partOfCollection")}
+        old += [triple for triple in graph if triple[1] not in links]
+        collection = "https://dl.ficlit.unibo.it/iiif/19428-19425/collection"
+        canvases = ["https://dl.ficlit.unibo.it/iiif/2/19428/canvas/p1", "https://dl.ficlit.unibo.it/iiif/2/19425/canvas/p1"]
+        server = ThreadingHTTPServer(("127.0.0.1", 0), type("OldGraphHandler", (GraphSparqlHandler,), {"graph": old}))
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            trp_qp = TriplestoreQueryProcessor()
+            self.assertTrue(trp_qp.setDbPathOrUrl(f"http://127.0.0.1:{server.server_port}/sparql"))
+            self.assertFalse(trp_qp.hasPartOfLinks())
+            self.assertEqual(len(trp_qp.getCanvasesInCollection(collection)), 32)
+            self.assertEqual(list(trp_qp.getCollectionsContainingCanvases(canvases)["id"]), [collection])
+            self.assertEqual(sorted(trp_qp.getManifestsContainingCanvases(canvases)["id"]),
+                             ["https://dl.ficlit.unibo.it/iiif/2/19425/manifest", "https://dl.ficlit.unibo.it/iiif/2/19428/manifest"])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+    def test_11_Models(self):
+        # the creators are split once, and the creator property gives back their string
+        manifest = Manifest("m1", "Label", creator="Alighieri, Dante; Boccaccio, Giovanni ;;Petrarca, Francesco")
+        self.assertEqual(manifest.getCreator(), ["Alighieri, Dante", "Boccaccio, Giovanni", "Petrarca, Francesco"])
+        self.assertEqual(manifest.creator, "Alighieri, Dante; Boccaccio, Giovanni; Petrarca, Francesco")
+        manifest.creator = manifest.creator
+        self.assertEqual(manifest.getCreator(), ["Alighieri, Dante", "Boccaccio, Giovanni", "Petrarca, Francesco"])
+        manifest.creator = None
+        self.assertEqual(manifest.getCreator(), [])
+        self.assertIsNone(manifest.creator)
+        self.assertIsNone(Canvas("c1", "Label").getTitle())
+
+        # the entities have no __dict__, so they take no attributes outside their slots
+        entities = [Image("i1"), Annotation("a1", "painting", Canvas("c1", "Label"), Image("i1")),
+                    Canvas("c1", "Label"), manifest, Collection("k1", "Label")]
+        for entity in entities:
+            self.assertFalse(hasattr(entity, "__dict__"))
+            with self.assertRaises(AttributeError):
+                entity.other = None
+